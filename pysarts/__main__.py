@@ -2,14 +2,93 @@
 """
 import argparse
 from datetime import datetime
-import logging
+import getopt
+import hashlib
+import itertools
 import os
+import pickle
+import sys
 
-from . import workflow
-from . import util
+# The workflow module pulls in the whole scientific stack so it is only
+# imported once the arguments have been parsed. See `_load_workflow`.
+workflow = None
+
+
+def _load_workflow():
+    """Import the workflow module and bind it to the module global `workflow`."""
+    global workflow
+    if workflow is None:
+        import pysarts.workflow as workflow
+    return workflow
+
+
+def _log_info(msg, *args):
+    """`logging.info` which only imports logging when it is called."""
+    import logging
+    logging.info(msg, *args)
+
+
+def _log_debug(msg, *args):
+    """`logging.debug` which only imports logging when it is called."""
+    import logging
+    logging.debug(msg, *args)
+
+
+def _load_config_cached(path):
+    """Parse the YAML configuration file at `path`, using an on-disk cache.
+
+    Parsed configurations are pickled to ~/.cache/pysarts keyed on the
+    modification time and size of the file. Set the environment variable
+    PYSARTS_NO_CONFIG_CACHE=1 to disable the cache.
+
+    Returns the parsed configuration dict.
+    """
+    from . import config
+
+    if os.environ.get('PYSARTS_NO_CONFIG_CACHE') == '1':
+        return config.read_yaml(path)
+
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    path_hash = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    cache_path = os.path.join(os.path.expanduser('~'), '.cache', 'pysarts',
+                              'config-' + path_hash + '.pkl')
+
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_key, conf = pickle.load(f)
+        if cached_key == key:
+            return conf
+    except (OSError, pickle.PickleError, EOFError):
+        pass
+
+    conf = config.read_yaml(path)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'wb') as f:
+            pickle.dump((key, conf), f, pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        _log_debug('Could not write configuration cache %s', cache_path)
+
+    return conf
+
+
+def _parse_master_date(value):
+    """Parse a date in the format YYYYmmddTHHMM.
+
+    Equivalent to `datetime.strptime(value, '%Y%m%dT%H%M')` without the cost of
+    importing and compiling the format with `_strptime`.
+    """
+    if len(value) != 13 or value[8] != 'T' or not (value[:8] + value[9:]).isdigit():
+        raise ValueError("time data '{:s}' does not match format "
+                         "'YYYYmmddTHHMM'".format(value))
+
+    return datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]),
+                    int(value[9:11]), int(value[11:13]))
 
 
 def execute_all_steps(args):
+    _load_workflow()
     workflow.execute_load_clip_resample_convert_step(args)
     workflow.execute_invert_unwrapped_phase(args)
     workflow.execute_calculate_dem_matmosphere_error(args)
@@ -20,10 +99,14 @@ def execute_on_all_slc_dates(args):
     directory that aren't filtered by the config file.
 
     """
+    from multiprocessing.pool import Pool
+    from . import util
+    _load_workflow()
+
     # First find all the dates in the UIFG_DIR directory
     ifg_paths = workflow.find_ifgs()
     ifg_date_pairs = [util.extract_timestamp_from_ifg_name(path) for path in ifg_paths]
-    ifg_dates = set([date for pair in ifg_date_pairs for date in pair])
+    ifg_dates = set(itertools.chain.from_iterable(ifg_date_pairs))
 
     # Copy the acquisition
     slc_time = workflow.config.MASTER_DATE.time()
@@ -31,18 +114,43 @@ def execute_on_all_slc_dates(args):
     # Only need to run the clip, resample, convert step once.
     workflow.execute_load_clip_resample_convert_step(args)
 
-    # Let's go!
-    logging.info('Going to run processing workflow on %d master dates',
-                 len(ifg_dates))
-    for date in ifg_dates:
-        logging.info('Switching master date to %s', date.strftime('%Y-%m-%d'))
-        workflow.config.MASTER_DATE = datetime.combine(date, slc_time)
-        workflow.execute_invert_unwrapped_phase(args)
-        workflow.execute_calculate_dem_matmosphere_error(args)
+    # Let's go! Each master date is independent so they are processed in
+    # parallel, each worker switching the master date of its own copy of the
+    # configuration.
+    _log_info('Going to run processing workflow on %d master dates',
+              len(ifg_dates))
+    pool_args = [(date, slc_time, args) for date in sorted(ifg_dates)]
+    with Pool(args.ncpu) as p:
+        p.starmap(_process_one_date, pool_args, chunksize=1)
 
 
-mainParser = argparse.ArgumentParser(prog='pysarts')
-mainParser.set_defaults(func=execute_all_steps)
+def _process_one_date(date, slc_time, args):
+    """Run the inversion and DEM error/master atmosphere steps with `date` as
+    the master date."""
+    _load_workflow()
+    _log_info('Switching master date to %s', date.strftime('%Y-%m-%d'))
+    workflow.config.MASTER_DATE = datetime.combine(date, slc_time)
+    workflow.execute_invert_unwrapped_phase(args)
+    workflow.execute_calculate_dem_matmosphere_error(args)
+
+
+def _identity(value):
+    return value
+
+
+class _ArgumentParser(argparse.ArgumentParser):
+    """An `argparse.ArgumentParser` that can be pickled.
+
+    The default type conversion registered by argparse is a local function
+    which can not be pickled so it is replaced by a module level one.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.register('type', None, _identity)
+
+
+mainParser = _ArgumentParser(prog='pysarts')
+mainParser.set_defaults(func=execute_all_steps, cmd=None)
 mainParser.add_argument('-d', '--directory',
                         action='store',
                         default='.',
@@ -57,203 +165,374 @@ mainParser.add_argument('-m', '--master',
                         help=('Master date to use in calculations. Overrides '
                               'the configuration file. Format YYYYmmddTHHMM'))
 
-subparsers = mainParser.add_subparsers()
-clip_resample_parser = subparsers.add_parser('clip-resample',
-                                             help='Clip and resample unwrapped interferograms')
-clip_resample_parser.set_defaults(func=workflow.execute_load_clip_resample_convert_step)
-invert_unwrapped_parser = subparsers.add_parser('invert',
-                                                help='Invert a time series of '
-                                                'interferograms')
-invert_unwrapped_parser.set_defaults(func=workflow.execute_invert_unwrapped_phase)
-calculate_master_atmos_parser = subparsers.add_parser('dem-master-atmos',
-                                                      help=('Calculate the DEM '
-                                                            'error and master '
-                                                            'atmosphere from a '
-                                                            'timeseries of interferograms'))
-calculate_master_atmos_parser.set_defaults(func=workflow.execute_calculate_dem_matmosphere_error)
-
-weather_radar_parser = subparsers.add_parser('radar-correlation',
-                                             help=('Calculate the correlation coefficient '
-                                                   'between precipitation rate and the master '
-                                                   'atmosphere'))
-weather_radar_parser.set_defaults(func=workflow.execute_master_atmosphere_rainfall_correlation)
-weather_radar_parser.add_argument('-r', '--rain-tolerance',
-                                  action='store',
-                                  type=float,
-                                  default=0,
-                                  help='Minimum precipitation rate to include in the calculation')
-
-god_mode_parser = subparsers.add_parser('alldates',
-                                        help=('Run clip-resample, invert, '
-                                              'and dem-master-atmos on all dates '
-                                              'allowed in the configuration '
-                                              'file'))
-god_mode_parser.set_defaults(func=execute_on_all_slc_dates)
-
-train_export_parser = subparsers.add_parser('export-train',
-                                            help='Export files for processing with TRAIN')
-train_export_parser.set_defaults(func=workflow.execute_export_train)
-
-era_delay_parser = subparsers.add_parser('era-delay',
-                                         help=('Calculate wet and dry delays '
-                                               'using ERA-interim weather '
-                                               'models'))
-era_delay_parser.set_defaults(func=workflow.execute_calculate_era_delays)
-era_delay_parser.add_argument('-c', '--max-processes',
-                              action='store',
-                              type=int,
-                              default=2,
-                              help='Maximum number of subprocesses to spawn')
-era_delay_parser.add_argument('-r', '--rainfall',
-                              action='store',
-                              nargs=2,
-                              default=None,
-                              type=int,
-                              help=('Include rainfall data in correction'
-                                    'Include the minimum and maximum'
-                                    'pressure levels to modify with'
-                                    'rainfall data'))
-era_delay_parser.add_argument('-b', '--blur',
-                              action='store',
-                              default=0,
-                              type=float,
-                              help=('Standard deviation of Gaussian filter '
-                                    'to apply to relative humidity. Only '
-                                    'applies if -r is passed. The standard '
-                                    'deviation of the array elements, not geographical '
-                                    'coordinates'))
-era_delay_parser.add_argument('-d', '--dates',
-                              action='store',
-                              default=None,
-                              nargs='*',
-                              help='Limit calculations to these dates')
-
-ifg_delay_parser = subparsers.add_parser('insar-delay',
-                                         help=('Calculate interferometric '
-                                               'slant delays'))
-ifg_delay_parser.set_defaults(func=workflow.execute_calculate_ifg_delays)
-
-liquid_delay_parser = subparsers.add_parser('liquid-delay',
-                                            help=('[EXPERIMENTAL] Estimate the liquid '
-                                                  'delay from precipitation rate'))
-liquid_delay_parser.set_defaults(func=workflow.execute_calculate_liquid_delay)
-liquid_delay_parser.add_argument('-c', '--cloud-thickness',
-                                 type=int,
-                                 action='store',
-                                 required=True,
-                                 help=('Cloud layer thickness in km'))
-liquid_delay_parser.add_argument('-d', '--date',
-                                 action='store',
-                                 default=None,
-                                 help=('Date to calculate delay for.'
-                                       'Defaults to configuration master'
-                                       'date'))
-liquid_delay_parser.add_argument('-b', '--blur',
-                                 action='store',
-                                 default=0,
-                                 type=float,
-                                 help=('Standard deviation of Gaussian filter '
-                                       'to apply to rainfall. The standard '
-                                       'deviation is in "units" of array '
-                                       'elements, not geographical '
-                                       'coordinates'))
-
-correction_parser = subparsers.add_parser('apply-corrections',
-                                          help=('Apply atmospheric corrections to '
-                                                'interferograms'))
-correction_parser.add_argument('-l', '--liquid', action='store_true',
-                               help=('Apply a correction for the liquid delay '
-                                     'if it has been calculated'))
-correction_parser.add_argument('-w', '--wet', action='store_true',
-                               help=('Apply a correction for the wet delay'))
-correction_parser.add_argument('-y', '--dry', action='store_true',
-                               help=('Apply a correction for the dry delay'))
-correction_parser.add_argument('-t', '--total', action='store_true',
-                               help=('Apply a correction for all delays. '
-                                     'Overrides -w, -l and -y'))
-correction_parser.add_argument('-d', '--dates', action='store', nargs='+',
-                               default=None, help=('Apply a correction for '
-                                                   'pairings of specific '
-                                                   'dates'))
-correction_parser.set_defaults(func=workflow.execute_correction_step)
-
-optim_help = ('[EXPERIMENTAL] Calculate the wet and dry delays using '
-              'weather models and precipitation data by dividing the '
-              'region into patches')
-optim_description = ('[EXPERIMENTAL] Divides the region into overlapping patches '
-                     'and tries to find the optimal pressure levels for the '
-                     'correction by minimising the standard deviation in each patch.')
-optim_correction_parser = subparsers.add_parser('optim-era-delay',
-                                                description=optim_description,
-                                                help=optim_help)
-optim_correction_parser.set_defaults(func=workflow.execute_rainfall_optimisation_step)
-optim_correction_parser.add_argument('-p', '--patch-size',
-                                     required=True,
-                                     nargs=2,
-                                     type=int,
-                                     action='store',
-                                     help='Patch size (lats x lons)')
-optim_correction_parser.add_argument('-c', '--ncpu',
-                                     type=int,
-                                     default=1,
-                                     help='Number of CPU cores to use')
-optim_correction_parser.add_argument('-m', '--master-date',
-                                     default=None,
-                                     action='store',
-                                     help=('Master date'))
-optim_correction_parser.add_argument('-s', '--slave-date',
-                                     default=None,
-                                     action='store',
-                                     help=('Slave date'))
-optim_correction_parser.add_argument('--min-pressure',
-                                     default=600,
-                                     type=float,
-                                     action='store',
-                                     help=('Minimum pressure level to test'))
-
-std_parser = subparsers.add_parser('std', help='Calculate the standard deviation of an interferogram')
-std_parser.set_defaults(func=workflow.execute_std)
-std_parser.add_argument('-m', '--master-date', required=True, action='store',
-                        help='The master date of an interferogram')
-std_parser.add_argument('-s', '--slave-date', required=True, action='store',
-                        help='The slave date of an interferogram')
-std_parser.add_argument('-o', '--original', action='store_true',
-                        help=('Calculate the standard deviation of '
-                              'the original interferogram'))
-std_parser.add_argument('-r', '--resampled', action='store_true',
-                        help=('Calculate the standard deviation of a '
-                              'resampled interferogram'))
-std_parser.add_argument('-c', '--corrected', action='store_true',
-                        help=('Calculate the standard deviation of a '
-                              'corrected interferogram'))
-
-global_description = ('[EXPERIMENTAL] Calculate the wet and dry delay using weather '
-                      'models and precipitation data. Attempts to find the optimal '
-                      'pressure levels by minimising the standard deviation of the '
-                      'interferogram across the whole region.')
-global_opt_parser = subparsers.add_parser('global-optim-era-delay',
-                                          description=global_description,
-                                          help=('[EXPERIMENTAL] Like optim-era-delay but '
-                                                'operates across the whole region'))
-global_opt_parser.set_defaults(func=workflow.execute_global_opt)
-global_opt_parser.add_argument('-m', '--master-date', required=True,
-                               action='store', help='Master date')
-global_opt_parser.add_argument('-s', '--slave-date', required=True,
-                               action='store', help='Slave date')
-global_opt_parser.add_argument('-p', '--plevel', required=True, type=float,
-                               action='store', help='Min plevel to test')
-
-
-clean_parser = subparsers.add_parser('clean',
-                                     help='Remove pysarts files')
-clean_parser.set_defaults(func=workflow.execute_clean_step)
-
-# Parse Arguments
-args = mainParser.parse_args()
-os.chdir(args.directory)
-workflow.load_config(args.config)
-
-if args.master:
-    workflow.config.MASTER_DATE = datetime.strptime(args.master, '%Y%m%dT%H%M')
-
-args.func(args)
+def _date_args(master=False, slave=False, required=False, blur=None, dates=None):
+    """Return specifications of the date and filtering options shared by several
+    subcommands.
+
+    Arguments
+    ---------
+    master : bool, opt
+      Include the -m/--master-date option.
+    slave : bool, opt
+      Include the -s/--slave-date option.
+    required : bool, opt
+      Whether -m and -s must be given.
+    blur : str, opt
+      Include the -b/--blur option, describing what the Gaussian filter is
+      applied to.
+    dates : str, opt
+      Include the -d/--dates option, taking this value as `nargs`.
+
+    Returns
+    -------
+    A list of (flags, kwargs) tuples as used in `_SUBCOMMAND_SPEC`.
+    """
+    specs = []
+    if master:
+        specs += [(('-m', '--master-date'),
+                   dict(required=required, default=None, action='store',
+                        help='Master date of an interferogram (YYYYMMDD)'))]
+    if slave:
+        specs += [(('-s', '--slave-date'),
+                   dict(required=required, default=None, action='store',
+                        help='Slave date of an interferogram (YYYYMMDD)'))]
+    if blur is not None:
+        specs += [(('-b', '--blur'),
+                   dict(action='store', default=0, type=float,
+                        help=('Standard deviation of Gaussian filter to apply '
+                              'to ' + blur + '. The standard deviation is in '
+                              '"units" of array elements, not geographical '
+                              'coordinates')))]
+    if dates is not None:
+        specs += [(('-d', '--dates'),
+                   dict(action='store', default=None, nargs=dates,
+                        help='Limit calculations to these dates (YYYYMMDD)'))]
+
+    return specs
+
+
+# Subcommands as (name, help, function, arguments[, description]) tuples.
+# `function` is either the name of a workflow function or a function in this
+# module. `arguments` is a list of (flags, kwargs) tuples passed to
+# `add_argument`.
+_SUBCOMMAND_SPEC = [
+    ('clip-resample', 'Clip and resample unwrapped interferograms',
+     'execute_load_clip_resample_convert_step', []),
+    ('invert', 'Invert a time series of interferograms',
+     'execute_invert_unwrapped_phase', []),
+    ('dem-master-atmos', ('Calculate the DEM error and master atmosphere from a '
+                          'timeseries of interferograms'),
+     'execute_calculate_dem_matmosphere_error', []),
+    ('radar-correlation', ('Calculate the correlation coefficient between '
+                           'precipitation rate and the master atmosphere'),
+     'execute_master_atmosphere_rainfall_correlation',
+     [(('-r', '--rain-tolerance'),
+       dict(action='store', type=float, default=0,
+            help='Minimum precipitation rate to include in the calculation'))]),
+    ('alldates', ('Run clip-resample, invert, and dem-master-atmos on all dates '
+                  'allowed in the configuration file'),
+     execute_on_all_slc_dates,
+     [(('-c', '--ncpu'),
+       dict(type=int, default=None,
+            help=('Number of master dates to process in parallel. Defaults to '
+                  'the number of CPU cores')))]),
+    ('export-train', 'Export files for processing with TRAIN',
+     'execute_export_train', []),
+    ('era-delay', 'Calculate wet and dry delays using ERA-interim weather models',
+     'execute_calculate_era_delays',
+     [(('-c', '--max-processes'),
+       dict(action='store', type=int, default=2,
+            help='Maximum number of subprocesses to spawn')),
+      (('-r', '--rainfall'),
+       dict(action='store', nargs=2, default=None, type=int,
+            help=('Include rainfall data in correction'
+                  'Include the minimum and maximum'
+                  'pressure levels to modify with'
+                  'rainfall data')))]
+     + _date_args(blur='relative humidity. Only applies if -r is passed',
+                  dates='*')),
+    ('insar-delay', 'Calculate interferometric slant delays',
+     'execute_calculate_ifg_delays', []),
+    ('liquid-delay', ('[EXPERIMENTAL] Estimate the liquid delay from '
+                      'precipitation rate'),
+     'execute_calculate_liquid_delay',
+     [(('-c', '--cloud-thickness'),
+       dict(type=int, action='store', required=True,
+            help='Cloud layer thickness in km')),
+      (('-d', '--date'),
+       dict(action='store', default=None,
+            help=('Date to calculate delay for.'
+                  'Defaults to configuration master'
+                  'date')))]
+     + _date_args(blur='rainfall')),
+    ('apply-corrections', 'Apply atmospheric corrections to interferograms',
+     'execute_correction_step',
+     [(('-l', '--liquid'),
+       dict(action='store_true',
+            help='Apply a correction for the liquid delay if it has been calculated')),
+      (('-w', '--wet'),
+       dict(action='store_true', help='Apply a correction for the wet delay')),
+      (('-y', '--dry'),
+       dict(action='store_true', help='Apply a correction for the dry delay')),
+      (('-t', '--total'),
+       dict(action='store_true',
+            help='Apply a correction for all delays. Overrides -w, -l and -y'))]
+     + _date_args(dates='+')),
+    ('optim-era-delay', ('[EXPERIMENTAL] Calculate the wet and dry delays using '
+                         'weather models and precipitation data by dividing the '
+                         'region into patches'),
+     'execute_rainfall_optimisation_step',
+     [(('-p', '--patch-size'),
+       dict(required=True, nargs=2, type=int, action='store',
+            help='Patch size (lats x lons)')),
+      (('-c', '--ncpu'),
+       dict(type=int, default=1, help='Number of CPU cores to use'))]
+     + _date_args(master=True, slave=True)
+     + [(('--min-pressure',),
+         dict(default=600, type=float, action='store',
+              help='Minimum pressure level to test'))],
+     ('[EXPERIMENTAL] Divides the region into patches and tries to '
+      'find the optimal pressure levels for the correction by minimising the '
+      'standard deviation in each patch.')),
+    ('std', 'Calculate the standard deviation of an interferogram',
+     'execute_std',
+     _date_args(master=True, slave=True, required=True)
+     + [(('-o', '--original'),
+         dict(action='store_true',
+              help='Calculate the standard deviation of the original interferogram')),
+        (('-r', '--resampled'),
+         dict(action='store_true',
+              help='Calculate the standard deviation of a resampled interferogram')),
+        (('-c', '--corrected'),
+         dict(action='store_true',
+              help='Calculate the standard deviation of a corrected interferogram'))]),
+    ('global-optim-era-delay', ('[EXPERIMENTAL] Like optim-era-delay but operates '
+                                'across the whole region'),
+     'execute_global_opt',
+     _date_args(master=True, slave=True, required=True)
+     + [(('-p', '--plevel'),
+         dict(required=True, type=float, action='store',
+              help='Min plevel to test'))],
+     ('[EXPERIMENTAL] Calculate the wet and dry delay using weather models and '
+      'precipitation data. Attempts to find the optimal pressure levels by '
+      'minimising the standard deviation of the interferogram across the whole '
+      'region.')),
+    ('clean', 'Remove pysarts files', 'execute_clean_step', []),
+]
+
+# Subcommand specifications keyed by name.
+SUBCOMMANDS = {spec[0]: spec for spec in _SUBCOMMAND_SPEC}
+
+# Workflow functions run by each subcommand.
+_DISPATCH = {sys.intern(name): sys.intern(func) for (name, _, func, *_)
+             in _SUBCOMMAND_SPEC if isinstance(func, str)}
+
+
+def _add_subparser(subparsers, name, help, func, arg_specs, description=None):
+    """Add the subcommand described by an entry of `_SUBCOMMAND_SPEC` to
+    `subparsers`."""
+    parser = subparsers.add_parser(name, help=help, description=description)
+    if isinstance(func, str):
+        parser.set_defaults(cmd=sys.intern(name))
+    else:
+        parser.set_defaults(func=func)
+
+    for (flags, kwargs) in arg_specs:
+        parser.add_argument(*flags, **kwargs)
+
+
+def _sniff_subcommand(argv=None):
+    """Find the subcommand named on the command line.
+
+    Returns the name of the subcommand or `None` if no known subcommand was
+    given or help was requested before it.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # Options of the main parser that consume the following token.
+    valued_options = ('-d', '--directory', '-c', '--config', '-m', '--master')
+
+    skip_next = False
+    for token in argv:
+        if skip_next:
+            skip_next = False
+            continue
+
+        if token in ('-h', '--help'):
+            return None
+        elif token.startswith('--'):
+            skip_next = '=' not in token and any(option.startswith(token) for option
+                                                 in valued_options[1::2])
+        elif token.startswith('-'):
+            skip_next = token in valued_options
+        else:
+            return token if token in SUBCOMMANDS else None
+
+    return None
+
+
+# Subcommands without options of their own.
+_NO_FLAG_SUBCOMMANDS = {'clean', 'invert', 'dem-master-atmos', 'export-train',
+                        'insar-delay'}
+
+
+def _parse_simple_args(argv=None):
+    """Parse the command line without argparse for subcommands in
+    `_NO_FLAG_SUBCOMMANDS`.
+
+    Returns an `argparse.Namespace` like the one `mainParser` would produce or
+    `None` if the command line needs the full parser.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    try:
+        opts, positional = getopt.getopt(argv, 'd:c:m:',
+                                         ['directory=', 'config=', 'master='])
+    except getopt.GetoptError:
+        return None
+
+    if len(positional) != 1 or positional[0] not in _NO_FLAG_SUBCOMMANDS:
+        return None
+
+    args = argparse.Namespace(directory='.', config='config.yml', master=None,
+                              func=execute_all_steps,
+                              cmd=sys.intern(positional[0]))
+    for (opt, value) in opts:
+        if opt in ('-d', '--directory'):
+            args.directory = value
+        elif opt in ('-c', '--config'):
+            args.config = value
+        else:
+            args.master = value
+
+    return args
+
+
+def _build_parser(subcommand):
+    """Add subparsers to `mainParser`.
+
+    Only the subparser for `subcommand` is added unless it is `None`, in which
+    case all subparsers are added. Returns `mainParser`.
+    """
+    subparsers = mainParser.add_subparsers()
+    if subcommand is None:
+        for spec in _SUBCOMMAND_SPEC:
+            _add_subparser(subparsers, *spec)
+    else:
+        _add_subparser(subparsers, *SUBCOMMANDS[subcommand])
+
+    return mainParser
+
+
+def _restore_suppress(parser):
+    """Restore the identity of `argparse.SUPPRESS` in an unpickled parser.
+
+    argparse compares against SUPPRESS using `is` but unpickling creates new
+    string objects. Subcommand names are re-interned for the same reason.
+
+    This walks argparse's private list of actions, so an AttributeError means
+    argparse has changed and the parser should be rebuilt instead.
+    """
+    cmd = parser.get_default('cmd')
+    if cmd is not None:
+        parser.set_defaults(cmd=sys.intern(cmd))
+
+    for action in parser._actions:
+        for attr in ('default', 'dest', 'help'):
+            if getattr(action, attr) == argparse.SUPPRESS:
+                setattr(action, attr, argparse.SUPPRESS)
+
+        # Subcommand actions map their names to parsers
+        if isinstance(action.choices, dict):
+            for subparser in action.choices.values():
+                if isinstance(subparser, argparse.ArgumentParser):
+                    _restore_suppress(subparser)
+
+
+# Errors that mean a cached parser can't be read or written, or doesn't match
+# this version of argparse.
+_PARSER_CACHE_ERRORS = (OSError, pickle.PickleError, EOFError, AttributeError)
+
+
+def _parser_cache_name(module, subcommand):
+    return 'parser-{:s}-{:s}.pkl'.format(module, subcommand or 'all')
+
+
+def _remove_stale_parser_caches(cache_dir):
+    """Delete parser caches in `cache_dir` that no current parser is saved to,
+    such as those from older versions of pysarts."""
+    current = {_parser_cache_name(module, subcommand)
+               for module in ('__main__', 'pysarts.__main__')
+               for subcommand in itertools.chain(SUBCOMMANDS, [None])}
+    for name in os.listdir(cache_dir):
+        if (name.startswith('parser-') and name.endswith('.pkl')
+                and name not in current):
+            os.remove(os.path.join(cache_dir, name))
+
+
+def _load_parser_cached(subcommand):
+    """Return `mainParser` built for `subcommand`, using an on-disk cache.
+
+    Built parsers are pickled to ~/.cache/pysarts, one file per subcommand,
+    along with the Python version and the modification time of this file. A
+    cached parser is only used if those still match, and is overwritten
+    otherwise. Set the environment variable PYSARTS_NO_PARSER_CACHE=1 to
+    disable the cache.
+    """
+    if os.environ.get('PYSARTS_NO_PARSER_CACHE') == '1':
+        return _build_parser(subcommand)
+
+    key = (tuple(sys.version_info[:3]), os.stat(__file__).st_mtime_ns)
+    cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'pysarts')
+    cache_path = os.path.join(cache_dir,
+                              _parser_cache_name(__name__, subcommand))
+
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_key, parser = pickle.load(f)
+        if cached_key == key:
+            _restore_suppress(parser)
+            return parser
+    except _PARSER_CACHE_ERRORS:
+        pass
+
+    parser = _build_parser(subcommand)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _remove_stale_parser_caches(cache_dir)
+        with open(cache_path, 'wb') as f:
+            pickle.dump((key, parser), f, pickle.HIGHEST_PROTOCOL)
+    except _PARSER_CACHE_ERRORS:
+        _log_debug('Could not write parser cache %s', cache_path)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+    return parser
+
+
+def main():
+    """Run pysarts from the command line."""
+    # Parse Arguments
+    args = _parse_simple_args()
+    if args is None:
+        parser = _load_parser_cached(_sniff_subcommand())
+        args = parser.parse_args()
+
+    _load_workflow()
+    args.directory = os.path.abspath(args.directory)
+    config_path = os.path.join(args.directory, args.config)
+    workflow.load_config(config_path, _load_config_cached(config_path), args.directory)
+
+    if args.master:
+        workflow.config.MASTER_DATE = _parse_master_date(args.master)
+
+    if args.cmd is not None:
+        getattr(workflow, _DISPATCH[args.cmd])(args)
+    else:
+        args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -71,11 +71,31 @@ workflow. Default 'WARN'. One of 'CRITICAL', 'ERROR', 'WARNING', 'INFO' or
 """
 LOG_LEVEL = 'WARN'
 
-def load_from_yaml(path):
-    """Load configuration from a YAML file."""
-    conf = {}
+def read_yaml(path):
+    """Read the YAML file at `path`, returning the parsed configuration dict."""
     with open(path) as f:
-        conf = yaml.safe_load(f)
+        return yaml.safe_load(f)
+
+
+def load_from_yaml(path, base_dir=None):
+    """Load configuration from a YAML file.
+
+    See `load_from_dict` for a description of `base_dir`.
+    """
+    load_from_dict(read_yaml(path), base_dir)
+
+
+def load_from_dict(conf, base_dir=None):
+    """Load configuration from a dict as parsed from a YAML configuration file.
+
+    If `base_dir` is given, relative file paths are resolved against it instead
+    of the current working directory.
+    """
+    def resolve(path):
+        path = os.path.expanduser(path)
+        if base_dir is not None:
+            path = os.path.normpath(os.path.join(base_dir, path))
+        return path
 
     global MASTER_DATE, DATES
     global UIFG_DIR, SCRATCH_DIR, WEATHER_RADAR_DIR
@@ -87,12 +107,12 @@ def load_from_yaml(path):
 
     MASTER_DATE = conf['master_date']
     DATES = conf.get('dates', DATES)
-    UIFG_DIR = os.path.expanduser(conf['files'].get('uifg_dir', UIFG_DIR))
-    SCRATCH_DIR = os.path.expanduser(conf['files'].get('scratch_dir', SCRATCH_DIR))
-    WEATHER_RADAR_DIR = os.path.expanduser(conf['files'].get('wr_dir', WEATHER_RADAR_DIR))
-    DEM_PATH = os.path.expanduser(conf['files'].get('dem', DEM_PATH))
-    BPERP_FILE_PATH = os.path.expanduser(conf['files'].get('baselines', BPERP_FILE_PATH))
-    ERA_MODELS_PATH = os.path.expanduser(conf['files'].get('era_models', ERA_MODELS_PATH))
+    UIFG_DIR = resolve(conf['files'].get('uifg_dir', UIFG_DIR))
+    SCRATCH_DIR = resolve(conf['files'].get('scratch_dir', SCRATCH_DIR))
+    WEATHER_RADAR_DIR = resolve(conf['files'].get('wr_dir', WEATHER_RADAR_DIR))
+    DEM_PATH = resolve(conf['files'].get('dem', DEM_PATH))
+    BPERP_FILE_PATH = resolve(conf['files'].get('baselines', BPERP_FILE_PATH))
+    ERA_MODELS_PATH = resolve(conf['files'].get('era_models', ERA_MODELS_PATH))
     RESOLUTION = conf.get('resolution', RESOLUTION)
     LOG_LEVEL = conf.get('log_level', LOG_LEVEL)
     REGION = conf.get('region', REGION)
@@ -1,7 +1,7 @@
 """Defines corrections for interferometric errors."""
 
 import numpy as np
-from numba import jit
+from numba import cuda, jit
 import numba
 from skimage.util import view_as_windows
 import logging
@@ -9,15 +9,26 @@ import itertools
 from multiprocessing.pool import Pool
 import sys
 
-from .util import trapz, interp1d_jit
+from .util import simps, interp1d_sorted_jit
 from .insar import SAR
 from .era import ERAModel
 from .geogrid import GeoGrid
 
+# The zenith delay kernel runs numba threads in the parent before pysarts forks
+# multiprocessing pools, and the TBB and GNU OpenMP threading layers can hang or
+# abort in forked children. Default to the fork-safe workqueue layer unless one
+# has been chosen, with NUMBA_THREADING_LAYER or numba.config.
+if numba.config.THREADING_LAYER == 'default':
+    numba.config.THREADING_LAYER = 'workqueue'
+
+# Zenith delays for DEMs with at least this many pixels are calculated on a
+# CUDA GPU if one is available. Smaller DEMs, such as patches, don't make up for
+# the cost of copying the weather model to the device.
+CUDA_MIN_PIXELS = 1000000
+
 
 def optim_era_delay(dem, ifg, mmodel, smodel, mwr, swr, min_plevel=200,
                     look_angle=0.367):
-    helper_args = []
     max_plevel_idx = 0
     try:
         min_plevel_idx = np.nonzero(mmodel.pressure[0, 0, :] == min_plevel)[0][0]
@@ -26,51 +37,51 @@ def optim_era_delay(dem, ifg, mmodel, smodel, mwr, swr, min_plevel=200,
                          'weather model')
 
     plevels = mmodel.pressure[0, 0, max_plevel_idx:min_plevel_idx + 1]
-    test_plevels = itertools.product(plevels, plevels)
-
-    for (master_p, slave_p) in test_plevels:
-        helper_args += [(dem, ifg, mmodel, smodel, mwr, swr, master_p, slave_p,
-                         look_angle)]
+    logging.debug('%d pressure combinations to test', plevels.size**2)
 
-    logging.debug('%d pressure combinations to test', len(helper_args))
+    # The delay on each date only depends on that date's pressure level so
+    # only 2 * P delays need to be calculated to test the P^2 combinations.
+    helper_args = ([(dem, mmodel, mwr, plevel, look_angle) for plevel in plevels]
+                   + [(dem, smodel, swr, plevel, look_angle) for plevel in plevels])
     with Pool() as p:
-        results = p.starmap(_optim_era_delay, helper_args)
+        delays = p.starmap(_optim_era_delay, helper_args)
+
+    m_total = np.stack(delays[:plevels.size])
+    s_total = np.stack(delays[plevels.size:])
+
+    results = []
+    for (master_idx, master_p) in enumerate(plevels):
+        # Standard deviations of the corrected interferogram for all slave
+        # pressure levels.
+        corrected_ifg = ifg.data - (m_total[master_idx] - s_total)
+        stds = corrected_ifg.reshape(plevels.size, -1).std(axis=1)
+        for (slave_p, std) in zip(plevels, stds):
+            print('{:4.1f}\t{:4.1f}\t{:2.5f}'.format(master_p, slave_p, std))
+            results += [{
+                'master_p': master_p,
+                'slave_p': slave_p,
+                'std': std
+            }]
+        sys.stdout.flush()
 
     return results
 
 
-def _optim_era_delay(dem, ifg, mmodel, smodel, mwr, swr, master_min_plevel,
-                     slave_min_plevel, look_angle=0.367):
-    """Returns a dictionary with the keys 'master_p', 'slave_p' and
-    'std'. 'master_p' and 'slave_p' are the minimum pressure levels used. 'std'
-    is the standard deviation of the corrected interferogram."""
-    # logging.debug('Testing master/slave pressure combination %.1f/%.1f',
-    #               master_min_plevel, slave_min_plevel)
-    mmodel.add_rainfall(mwr.data, master_min_plevel, 1000, 10)
-    smodel.add_rainfall(swr.data, slave_min_plevel, 1000, 10)
-
-    mwet, mdry, _ = calculate_era_zenith_delay(mmodel, dem)
-    swet, sdry, _ = calculate_era_zenith_delay(smodel, dem)
-
-    mwet, mdry = mwet.zenith2slant(look_angle), mdry.zenith2slant(look_angle)
-    swet, sdry = swet.zenith2slant(look_angle), sdry.zenith2slant(look_angle)
+def _optim_era_delay(dem, model, rainfall, min_plevel, look_angle=0.367):
+    """Returns the total slant delay predicted by `model` after adding
+    `rainfall` to pressure levels between `min_plevel` and 1000 hPa. `model` is
+    not modified."""
+    model = ERAModel(model.lats, model.lons, model.date, model.rel_hum.copy(),
+                     model.temp, model.geopot, model.pressure)
+    model.add_rainfall(rainfall.data, min_plevel, 1000, 10)
 
-    ifg_total = (mwet.data + mdry.data) - (swet.data + sdry.data)
-    corrected_ifg = ifg.data - ifg_total
+    wet, dry = calculate_era_zenith_delay_raw(model, dem)
 
-    std = corrected_ifg.std()
-    print('{:4.1f}\t{:4.1f}\t{:2.5f}'.format(master_min_plevel, slave_min_plevel, std))
-    sys.stdout.flush()
-
-    return {
-        'master_p': master_min_plevel,
-        'slave_p': slave_min_plevel,
-        'std': std
-    }
+    return (wet + dry) / np.cos(look_angle)
 
 
 def patches_era_delay(dem, ifg, mmodel, smodel, mwr, swr, min_plevel=200,
-                      patch_size=(128, 128), look_angle=0.367):
+                      patch_size=(128, 128), look_angle=0.367, nprocesses=1):
     """Calculate interferometric delay using an advanced patching algorithm.
 
     Arguments
@@ -92,9 +103,13 @@ def patches_era_delay(dem, ifg, mmodel, smodel, mwr, swr, min_plevel=200,
     patch_size : tuple, opt
       The size of patches to process in pixels. Default (128, 128) (lat,
       lon). This needs to divide evenly into the shape of the first two axes of
-      the other parameters.
+      the other parameters, otherwise a ValueError is raised.
     look_angle : float | ndarray, opt
       The look angle of the satellite in radians. Default 0.367 (~21 deg).
+    nprocesses : int, opt
+      The number of processes to spread patches containing rainfall
+      over. Default 1, processing patches in the calling process. Must be 1
+      when called from a daemonic process such as a `Pool` worker.
 
     Returns
     -------
@@ -121,43 +136,40 @@ def patches_era_delay(dem, ifg, mmodel, smodel, mwr, swr, min_plevel=200,
     The latitudes and longitudes of `dem` are used to index all other
     parameters. Everything needs to be on the same grid as a result.
     """
+    if (dem.data.shape[0] % patch_size[0] != 0
+            or dem.data.shape[1] % patch_size[1] != 0):
+        raise ValueError('Patch size does not divide evenly into the data')
+
     # Divide input matrices into view windows.
-    stride = (int(patch_size[0] / 2), int(patch_size[1] / 2)) # Overlap boundaries
+    stride = (patch_size[0], patch_size[1])  # Non-overlapping patches
     pdem = view_as_windows(dem.data, patch_size, stride)
-    plats = view_as_windows(dem.lats, (patch_size[0],), (stride[0],))
-    plons = view_as_windows(dem.lons, (patch_size[1],), (stride[1],))
 
     pifg = view_as_windows(ifg.data, patch_size, stride)
     pmwr = view_as_windows(mwr.data, patch_size, stride)
     pswr = view_as_windows(swr.data, patch_size, stride)
 
-    nplevels = mmodel.pressure.shape[2]
-    pmrel_hum = view_as_windows(mmodel.rel_hum, patch_size + (nplevels,), stride + (nplevels,))
-    pmtemp = view_as_windows(mmodel.temp, patch_size + (nplevels,), stride + (nplevels,))
-    pmgeopot = view_as_windows(mmodel.geopot, patch_size + (nplevels,), stride + (nplevels,))
-    pmpressure = view_as_windows(mmodel.pressure, patch_size + (nplevels,), stride + (nplevels,))
-
-    psrel_hum = view_as_windows(smodel.rel_hum, patch_size + (nplevels,), stride + (nplevels,))
-    pstemp = view_as_windows(smodel.temp, patch_size + (nplevels,), stride + (nplevels,))
-    psgeopot = view_as_windows(smodel.geopot, patch_size + (nplevels,), stride + (nplevels,))
-    pspressure = view_as_windows(smodel.pressure, patch_size + (nplevels,), stride + (nplevels,))
-
-    # Preallocate output matrices and divide them into patches
-    mwet = np.zeros(dem.data.shape)
-    mdry = np.zeros(dem.data.shape)
-    swet = np.zeros(dem.data.shape)
-    sdry = np.zeros(dem.data.shape)
-    m_plevels = np.zeros(dem.data.shape)
-    s_plevels = np.zeros(dem.data.shape)
-
-    pmwet = view_as_windows(mwet, patch_size, stride)
-    pmdry = view_as_windows(mdry, patch_size, stride)
-    pswet = view_as_windows(swet, patch_size, stride)
-    psdry = view_as_windows(sdry, patch_size, stride)
-    pm_plevels = view_as_windows(m_plevels, patch_size, stride)
-    ps_plevels = view_as_windows(s_plevels, patch_size, stride)
-
-    # Iterate through patch by patch
+    # Preallocate output matrices. Every patch is written to below.
+    mwet = np.empty(dem.data.shape)
+    mdry = np.empty(dem.data.shape)
+    swet = np.empty(dem.data.shape)
+    sdry = np.empty(dem.data.shape)
+    m_plevels = np.empty(dem.data.shape)
+    s_plevels = np.empty(dem.data.shape)
+
+    def patch(y, x):
+        """Index of patch (y, x) in the full size matrices."""
+        return (slice(y * stride[0], y * stride[0] + patch_size[0]),
+                slice(x * stride[1], x * stride[1] + patch_size[1]))
+
+    # The delay at each pixel only depends on the weather model above it so
+    # the delay for rain free patches is sliced out of the delay for the whole
+    # region.
+    full_mwet, full_mdry = calculate_era_zenith_delay_raw(mmodel, dem)
+    full_swet, full_sdry = calculate_era_zenith_delay_raw(smodel, dem)
+
+    # Iterate through patch by patch. Patches with rainfall are collected and
+    # optimised afterwards, possibly in parallel.
+    rain_patches = []
     for y, x in np.ndindex(pdem.shape[0], pdem.shape[1]):
         # Check if there's no rainfall on both dates. If so just do a normal
         # weather model correction.
@@ -166,56 +178,54 @@ def patches_era_delay(dem, ifg, mmodel, smodel, mwr, swr, min_plevel=200,
                      ifg.master_date, ifg.slave_date)
         if pmwr[y, x, :, :].sum() == 0 and pswr[y, x, :, :].sum() == 0:
             logging.debug('No rainfall in patch (%d, %d)', y, x)
-            # Construct new DEM and ERAModel objects from patches
-            sub_mmodel = ERAModel(plats[y], plons[x], mmodel.date,
-                                  pmrel_hum[y, x, 0],
-                                  pmtemp[y, x, 0],
-                                  pmgeopot[y, x, 0],
-                                  pmpressure[y, x, 0])
-            sub_smodel = ERAModel(plats[y], plons[x], mmodel.date,
-                                  psrel_hum[y, x, 0],
-                                  pstemp[y, x, 0],
-                                  psgeopot[y, x, 0],
-                                  pspressure[y, x, 0])
-            sub_dem = GeoGrid(plons[x], plats[y], pdem[y, x])
-
-            sub_mwet, sub_mdry, _ = calculate_era_zenith_delay(sub_mmodel,
-                                                               sub_dem)
-            sub_swet, sub_sdry, _ = calculate_era_zenith_delay(sub_smodel,
-                                                               sub_dem)
-
             # Update output matrices
-            pmwet[y, x, :, :] = sub_mwet.data
-            pmdry[y, x, :, :] = sub_mdry.data
-            pswet[y, x, :, :] = sub_swet.data
-            psdry[y, x, :, :] = sub_sdry.data
-            pm_plevels[y, x, :, :] = np.nan
-            ps_plevels[y, x, :, :] = np.nan
-
-            continue
+            idx = patch(y, x)
+            mwet[idx] = full_mwet[idx]
+            mdry[idx] = full_mdry[idx]
+            swet[idx] = full_swet[idx]
+            sdry[idx] = full_sdry[idx]
+            m_plevels[idx] = np.nan
+            s_plevels[idx] = np.nan
         else:
             # Time to go with the more complicated algorithm
             logging.debug('Rainfall found in patch (%d, %d)', y, x)
-            output = _optimise_zenith_delay(pdem[y, x],
-                                            pifg[y, x],
-                                            pmwr[y, x],
-                                            pswr[y, x],
-                                            pmtemp[y, x, 0],
-                                            pmrel_hum[y, x, 0],
-                                            pmpressure[y, x, 0],
-                                            pmgeopot[y, x, 0],
-                                            pstemp[y, x, 0],
-                                            psrel_hum[y, x, 0],
-                                            pspressure[y, x, 0],
-                                            psgeopot[y, x, 0],
-                                            look_angle,
-                                            min_plevel)
-            pmwet[y, x, :, :] = output[0]
-            pmdry[y, x, :, :] = output[1]
-            pswet[y, x, :, :] = output[2]
-            psdry[y, x, :, :] = output[3]
-            pm_plevels[y, x, :, :] = output[4]
-            ps_plevels[y, x, :, :] = output[5]
+            rain_patches += [(y, x)]
+
+    def rain_args():
+        """Arguments for `_optimise_zenith_delay` for each rainy patch.
+
+        The weather model patches are copied as they're consumed so only the
+        patches being worked on are held in memory.
+        """
+        for y, x in rain_patches:
+            idx = patch(y, x)
+            yield (pdem[y, x],
+                   pifg[y, x],
+                   pmwr[y, x],
+                   pswr[y, x],
+                   _stack_model_patch(mmodel, idx),
+                   _stack_model_patch(smodel, idx),
+                   look_angle,
+                   min_plevel)
+
+    def store(outputs):
+        for ((y, x), output) in zip(rain_patches, outputs):
+            idx = patch(y, x)
+            mwet[idx] = output[0]
+            mdry[idx] = output[1]
+            swet[idx] = output[2]
+            sdry[idx] = output[3]
+            m_plevels[idx] = output[4]
+            s_plevels[idx] = output[5]
+
+    if nprocesses == 1:
+        store(itertools.starmap(_optimise_zenith_delay, rain_args()))
+    else:
+        # Pool.starmap would build the whole argument list up front, imap
+        # pulls arguments from the generator as workers need them.
+        with Pool(nprocesses) as p:
+            store(p.imap(_optimise_zenith_delay_star, rain_args(),
+                         chunksize=1))
 
     return (SAR(dem.lons, dem.lats, mwet, ifg.master_date),
             SAR(dem.lons, dem.lats, mdry, ifg.master_date),
@@ -224,10 +234,35 @@ def patches_era_delay(dem, ifg, mmodel, smodel, mwr, swr, min_plevel=200,
             m_plevels, s_plevels)
 
 
-# UGLY FUNCTION SIGNATURE.
-def _optimise_zenith_delay(pdem, pifg, pmwr, pswr, pmtemp, pmrel_hum,
-                           pmpressure, pmgeopot, pstemp, psrel_hum, pspressure,
-                           psgeopot, look_angle, min_plevel):
+def _stack_model_patch(model, idx):
+    """Copy a patch of a weather model into a single contiguous array.
+
+    Arguments
+    ---------
+    model : era.ERAModel
+      The weather model to take the patch from.
+    idx : tuple(slice, slice)
+      Index of the patch along the latitude and longitude axes.
+
+    Returns
+    -------
+    A (4,n,m,o) ndarray containing the relative humidity, temperature,
+    geopotential and pressure of the patch in that order.
+    """
+    return np.stack([model.rel_hum[idx], model.temp[idx], model.geopot[idx],
+                     model.pressure[idx]])
+
+
+def _optimise_zenith_delay_star(args):
+    """Call `_optimise_zenith_delay` with a tuple of arguments."""
+    return _optimise_zenith_delay(*args)
+
+
+def _optimise_zenith_delay(pdem, pifg, pmwr, pswr, pmmodel, psmodel,
+                           look_angle, min_plevel):
+    pmrel_hum, pmtemp, pmgeopot, pmpressure = pmmodel
+    psrel_hum, pstemp, psgeopot, pspressure = psmodel
+
     max_plevel_idx = 0
     try:
         min_plevel_idx = np.nonzero(pmpressure[0, 0, :] == min_plevel)[0][0]
@@ -236,10 +271,6 @@ def _optimise_zenith_delay(pdem, pifg, pmwr, pswr, pmtemp, pmrel_hum,
                          'weather model')
 
     # Create output patches
-    pmwet = np.zeros(pdem.shape)
-    pmdry = np.zeros(pdem.shape)
-    pswet = np.zeros(pdem.shape)
-    psdry = np.zeros(pdem.shape)
     pm_plevels = np.empty(pdem.shape)  # 1 HPa initial
     pm_plevels[:, :] = np.nan
     ps_plevels = np.empty(pdem.shape)
@@ -255,19 +286,11 @@ def _optimise_zenith_delay(pdem, pifg, pmwr, pswr, pmtemp, pmrel_hum,
     psmodel_obj = ERAModel(dummy_lats, dummy_lons, None, psrel_hum, pstemp,
                            psgeopot, pspressure)
 
-    # Start with the standard deviation of a pure ERA correction.
-    logging.debug('Calculating initial standard deviation')
-    mwet_init, mdry_init, _ = calculate_era_zenith_delay(pmmodel_obj, pdem_obj)
-    swet_init, sdry_init, _ = calculate_era_zenith_delay(psmodel_obj, pdem_obj)
-    correction_init = pifg - ((mwet_init.data + mdry_init.data)
-                              - (swet_init.data + sdry_init.data))
-    # max_std = correction_init.std()
+    # Start from a pure ERA correction. These delays are kept if no
+    # combination of pressure levels gives a finite standard deviation.
+    pmwet, pmdry = calculate_era_zenith_delay_raw(pmmodel_obj, pdem_obj)
+    pswet, psdry = calculate_era_zenith_delay_raw(psmodel_obj, pdem_obj)
     max_std = np.inf
-    pmwet = mwet_init.data
-    pmdry = mdry_init.data
-    pswet = swet_init.data
-    psdry = sdry_init.data
-    logging.debug('Initial standard deviation: %.5f', max_std)
 
     # Avoid doing iteration over pressure levels for patches where there's no
     # rain
@@ -289,62 +312,92 @@ def _optimise_zenith_delay(pdem, pifg, pmwr, pswr, pmtemp, pmrel_hum,
         slave_max_plevel_idx = 0
         slave_min_plevel_idx = 0
 
+    # Buffer for the interferometric delay and the cosine mapping to slant
+    # delays.
+    ifg_total = np.empty(pifg.shape)
+    inv_cos = 1.0 / np.cos(look_angle)
+
+    # Scratch relative humidity that rainfall is added to, reset from the
+    # original values for each pressure level.
+    pmmodel_obj.rel_hum = np.empty_like(pmrel_hum)
+    psmodel_obj.rel_hum = np.empty_like(psrel_hum)
+
+    # The delay on each date only depends on that date's pressure level.
+    # Calculate the slave delays once for each pressure level and the master
+    # delay once per iteration of the outer loop.
+    slave_delays = []
+    for ps_idx in range(slave_max_plevel_idx, slave_min_plevel_idx + 1):
+        # Reset relative humidity to its original values and add rainfall
+        np.copyto(psmodel_obj.rel_hum, psrel_hum)
+        if not no_slave_rain:
+            psmodel_obj.add_rainfall(pswr, pspressure[0, 0, ps_idx], 1000, 10)
+
+        swet_zen, sdry_zen = calculate_era_zenith_delay_raw(psmodel_obj,
+                                                            pdem_obj)
+        slave_delays += [(ps_idx, swet_zen, sdry_zen)]
+
     for pm_idx in range(master_max_plevel_idx, master_min_plevel_idx + 1):
-        for ps_idx in range(slave_max_plevel_idx, slave_min_plevel_idx + 1):
+        # Reset relative humidity to its original values and add rainfall
+        np.copyto(pmmodel_obj.rel_hum, pmrel_hum)
+        if not no_master_rain:
+            pmmodel_obj.add_rainfall(pmwr, pmpressure[0, 0, pm_idx], 1000, 10)
+
+        mwet_zen, mdry_zen = calculate_era_zenith_delay_raw(pmmodel_obj,
+                                                            pdem_obj)
+
+        for (ps_idx, swet_zen, sdry_zen) in slave_delays:
             logging.debug('Testing master pressure level %d slave pressure '
                           'level %d', pmpressure[0, 0, pm_idx],
                           pspressure[0, 0, ps_idx])
-            # Reset relative humidity in master and slave models to their
-            # original values.
-            pmmodel_obj.rel_hum = pmrel_hum.copy()
-            psmodel_obj.rel_hum = psrel_hum.copy()
-
-            # Add rainfall
-            if not no_master_rain:
-                pmmodel_obj.add_rainfall(pmwr, pmpressure[0, 0, pm_idx], 1000, 10)
-            if not no_slave_rain:
-                psmodel_obj.add_rainfall(pswr, pspressure[0, 0, ps_idx], 1000, 10)
-
-            # Calculate the zenith delays
-            mwet_zen, mdry_zen, _ = calculate_era_zenith_delay(pmmodel_obj,
-                                                               pdem_obj)
-            swet_zen, sdry_zen, _ = calculate_era_zenith_delay(psmodel_obj,
-                                                               pdem_obj)
-
-            # Convert to slants
-            mwet_slant = mwet_zen.zenith2slant(look_angle)
-            mdry_slant = mdry_zen.zenith2slant(look_angle)
-            swet_slant = swet_zen.zenith2slant(look_angle)
-            sdry_slant = sdry_zen.zenith2slant(look_angle)
-
-            # Compute total delay and then interferometric delay
-            mtotal = mwet_slant.data + mdry_slant.data
-            stotal = swet_slant.data + sdry_slant.data
-            ifg_total = mtotal - stotal
+
+            # Compute the interferometric slant delay
+            np.add(mwet_zen, mdry_zen, out=ifg_total)
+            ifg_total -= swet_zen
+            ifg_total -= sdry_zen
+            ifg_total *= inv_cos
 
             # Apply correction and check standard deviation. If it's improved
             # store the updated models, otherwise we move on.
-            corrected_ifg = pifg - ifg_total
+            std_val = _diff_std(pifg, ifg_total)
 
-            if corrected_ifg.std() < max_std:
-                pmwet[:, :] = mwet_zen.data.copy()
-                pmdry[:, :] = mdry_zen.data.copy()
-                pswet[:, :] = swet_zen.data.copy()
-                psdry[:, :] = sdry_zen.data.copy()
+            if std_val < max_std:
+                pmwet[:, :] = mwet_zen
+                pmdry[:, :] = mdry_zen
+                pswet[:, :] = swet_zen
+                psdry[:, :] = sdry_zen
                 pm_plevels[:, :] = np.nan if no_master_rain else pmpressure[0, 0, pm_idx]
                 ps_plevels[:, :] = np.nan if no_slave_rain else pspressure[0, 0, ps_idx]
-                max_std = corrected_ifg.std()
+                max_std = std_val
                 logging.debug('Accepting model with standard deviation %.5f',
                               max_std)
             else:
                 logging.debug('Rejecting model with standard deviation %.5f',
-                              corrected_ifg.std())
+                              std_val)
 
     return (pmwet, pmdry, pswet, psdry, pm_plevels, ps_plevels)
 
 
-@jit
-def calculate_era_zenith_delay(model, dem):
+@jit(nopython=True, cache=True)
+def _diff_std(a, b):
+    """Standard deviation of `a - b` without forming the difference.
+
+    Uses Welford's algorithm so the result matches `(a - b).std()` to rounding.
+    """
+    mean = 0.0
+    m2 = 0.0
+    n = 0
+    for y in range(a.shape[0]):
+        for x in range(a.shape[1]):
+            n += 1
+            diff = a[y, x] - b[y, x]
+            delta = diff - mean
+            mean += delta / n
+            m2 += delta * (diff - mean)
+
+    return np.sqrt(m2 / n)
+
+
+def calculate_era_zenith_delay(model, dem, nheights=128):
     """Calculates the one-way zenith delay in cm predicted by a weather
     model.
 
@@ -354,6 +407,9 @@ def calculate_era_zenith_delay(model, dem):
       The weather model to use in the delay calculation.
     dem : geogrid.GeoGrid
       A GeoGrid instance defining the DEM in metres.
+    nheights : int, opt
+      Number of heights between the surface and 15 km the refractivity is
+      sampled at when integrating. Default 128.
 
     Returns
     -------
@@ -364,41 +420,162 @@ def calculate_era_zenith_delay(model, dem):
     -----
     `model` should be interpolated so it is on the same grid as `dem`.
     """
+    wet_delay, dry_delay = calculate_era_zenith_delay_raw(model, dem, nheights)
+
+    wet_delay = SAR(model.lons, model.lats, wet_delay, model.date)
+    dry_delay = SAR(model.lons, model.lats, dry_delay, model.date)
+    total_delay = SAR(model.lons, model.lats, dry_delay.data + wet_delay.data,
+                      model.date)
+
+    return (wet_delay, dry_delay, total_delay)
+
+
+def calculate_era_zenith_delay_raw(model, dem, nheights=128):
+    """As `calculate_era_zenith_delay` but returns the wet and dry delays as
+    plain ndarrays and skips calculating the total delay.
+
+    Returns
+    -------
+    A two tuple containing (wet_delay, dry_delay) as (n,m) ndarrays of the
+    one-way zenith delay in centimetres.
+    """
     if (dem.lats.size != model.lats.size
         or dem.lons.size != model.lons.size):
         raise IndexError('Size of model grid does not match size of dem')
 
-    # Allocate output arrays
-    wet_delay = np.empty((model.lats.size, model.lons.size))
-    dry_delay = np.empty((model.lats.size, model.lons.size))
-
     # Cache the height and ppwv to avoid recalculating at every pixel.
     height = model.height
     ppwv = model.ppwv
 
+    if dem.data.size >= CUDA_MIN_PIXELS and _cuda_available():
+        return _calculate_zenith_delay_cuda(dem.data, height, model.temp, ppwv,
+                                            model.pressure, nheights)
+
     dry_delay = np.empty(dem.data.shape)
     wet_delay = np.empty(dem.data.shape)
 
     _calculate_zenith_delay_jit(dem.data, height, model.temp, ppwv,
-                                model.pressure, wet_delay, dry_delay)
+                                model.pressure, wet_delay, dry_delay,
+                                nheights)
 
-    wet_delay = SAR(model.lons, model.lats, wet_delay, model.date)
-    dry_delay = SAR(model.lons, model.lats, dry_delay, model.date)
-    total_delay = SAR(model.lons, model.lats, dry_delay.data + wet_delay.data,
-                      model.date)
+    return (wet_delay, dry_delay)
 
-    return (wet_delay, dry_delay, total_delay)
+
+_CUDA_AVAILABLE = None
+
+
+def _cuda_available():
+    """Check once whether a CUDA GPU can be used."""
+    global _CUDA_AVAILABLE
+    if _CUDA_AVAILABLE is None:
+        try:
+            _CUDA_AVAILABLE = cuda.is_available()
+        except Exception:
+            _CUDA_AVAILABLE = False
+
+    return _CUDA_AVAILABLE
+
+
+def _calculate_zenith_delay_cuda(dem, height, temp, ppwv, pressure, nheights):
+    """Calculate the zenith wet and dry delay on a CUDA GPU.
+
+    Takes the same inputs as `_calculate_zenith_delay_jit` but returns the wet
+    and dry delays rather than writing them into output arrays.
+    """
+    dem_d = cuda.to_device(np.ascontiguousarray(dem, dtype=np.float64))
+    height_d = cuda.to_device(np.ascontiguousarray(height, dtype=np.float64))
+    temp_d = cuda.to_device(np.ascontiguousarray(temp, dtype=np.float64))
+    ppwv_d = cuda.to_device(np.ascontiguousarray(ppwv, dtype=np.float64))
+    pressure_d = cuda.to_device(np.ascontiguousarray(pressure, dtype=np.float64))
+    out_wet_d = cuda.device_array(dem.shape, dtype=np.float64)
+    out_dry_d = cuda.device_array(dem.shape, dtype=np.float64)
+
+    block = (16, 16)
+    grid = ((dem.shape[0] + block[0] - 1) // block[0],
+            (dem.shape[1] + block[1] - 1) // block[1])
+    _zenith_delay_kernel[grid, block](dem_d, height_d, temp_d, ppwv_d,
+                                      pressure_d, out_wet_d, out_dry_d,
+                                      nheights)
+
+    return (out_wet_d.copy_to_host(), out_dry_d.copy_to_host())
+
+
+@cuda.jit
+def _zenith_delay_kernel(dem, height, temp, ppwv, pressure, out_wet, out_dry,
+                         nheights):
+    """CUDA version of `_calculate_zenith_delay_jit` with one thread per pixel.
+
+    Per-thread arrays are too large for registers, so the model is
+    interpolated at each sample height as the Simpson's rule sum is
+    accumulated instead of filling buffers first.
+    """
+    y, x = cuda.grid(2)
+    if y >= dem.shape[0] or x >= dem.shape[1]:
+        return
+
+    k1 = 0.776  # K Pa^{-1}
+    k2 = 0.716  # K Pa^{-1}
+    k3 = 3.75 * 10**3  # K^2 Pa{-1}
+    Rd = 287.053
+    Rv = 461.524
+    wet_coeff = k2 - (k1 * Rd / Rv)
+    top = 15000.0
+
+    nlevels = height.shape[2]
+    step = (top - dem[y, x]) / (nheights - 1)
+    nsimps = nheights if nheights % 2 == 1 else nheights - 1
+
+    wet_sum = 0.0
+    dry_sum = 0.0
+    upper = 0
+    for k in range(nheights):
+        new_height = dem[y, x] + k * step if k < nheights - 1 else top
+
+        # Linear interpolation with extrapolation, as in interp1d_sorted_jit.
+        while upper < nlevels and height[y, x, upper] <= new_height:
+            upper += 1
+        if upper == 0:
+            idx0, idx1 = 0, 1
+        elif upper == nlevels:
+            idx0, idx1 = nlevels - 2, nlevels - 1
+        else:
+            idx0, idx1 = upper - 1, upper
+        frac = ((new_height - height[y, x, idx0])
+                / (height[y, x, idx1] - height[y, x, idx0]))
+        itemp = temp[y, x, idx0] + frac * (temp[y, x, idx1] - temp[y, x, idx0])
+        ippwv = ppwv[y, x, idx0] + frac * (ppwv[y, x, idx1] - ppwv[y, x, idx0])
+        ipressure = (pressure[y, x, idx0]
+                     + frac * (pressure[y, x, idx1] - pressure[y, x, idx0]))
+
+        # Refractivities with pressures converted from hPa to Pa
+        inv_temp = 1.0 / itemp
+        wet_refract = 100 * ippwv * inv_temp * (wet_coeff + k3 * inv_temp)
+        dry_refract = k1 * 100 * ipressure * inv_temp
+
+        # Simpson's rule weights, with a trailing trapezium for an odd number
+        # of intervals as in util.simps.
+        weight = 0.0
+        if k < nsimps and nsimps >= 3:
+            if k == 0 or k == nsimps - 1:
+                weight = step / 3.0
+            elif k % 2 == 1:
+                weight = 4.0 * step / 3.0
+            else:
+                weight = 2.0 * step / 3.0
+        if nsimps != nheights and k >= nheights - 2:
+            weight += step / 2.0
+
+        wet_sum += weight * wet_refract
+        dry_sum += weight * dry_refract
+
+    # Convert delays to centimetres
+    out_wet[y, x] = 10**-6 * wet_sum * 100
+    out_dry[y, x] = 10**-6 * dry_sum * 100
 
 
-@jit(numba.void(numba.float64[:, :],
-                numba.float64[:, :, :],
-                numba.float64[:, :, :],
-                numba.float64[:, :, :],
-                numba.float64[:, :, :],
-                numba.float64[:, :],
-                numba.float64[:, :]),
-     nopython=True)
-def _calculate_zenith_delay_jit(dem, height, temp, ppwv, pressure, out_wet, out_dry):
+@jit(nopython=True, parallel=True, fastmath=True, cache=True)
+def _calculate_zenith_delay_jit(dem, height, temp, ppwv, pressure, out_wet, out_dry,
+                                nheights):
     """JIT optimised function to calculate the zenith wet and dry delay.
 
     Arguments
@@ -417,6 +594,8 @@ def _calculate_zenith_delay_jit(dem, height, temp, ppwv, pressure, out_wet, out_
       Matrix to save wet delay into.
     out_dry : (n,m) ndarray
       Matrix to save dry delay into.
+    nheights : int
+      Number of heights to sample the refractivity at.
 
     Returns
     -------
@@ -427,8 +606,7 @@ def _calculate_zenith_delay_jit(dem, height, temp, ppwv, pressure, out_wet, out_
     # TRAIN by David Bekaert. There are some differences that give slightly
     # different numerical results. Notably, the dry delay is found by
     # integrating pressure with height rather than by calculating the surface
-    # pressure. Note the performance is rather poor due to the reliance on a
-    # loop. This can probably be made faster.
+    # pressure. Pixels are independent so rows are processed in parallel.
     # Constants and formulae from Hanssen 2001
     k1 = 0.776  # K Pa^{-1}
     k2 = 0.716  # K Pa^{-1}
@@ -436,30 +614,39 @@ def _calculate_zenith_delay_jit(dem, height, temp, ppwv, pressure, out_wet, out_
     Rd = 287.053
     Rv = 461.524
 
-    nheights = 1024
-
-    # Caches for the interpolated variables. Needed for JIT evaluation of the
-    # interpolation function.
-    itemp = np.zeros(nheights)
-    ippwv = np.zeros(nheights)
-    ipressure = np.zeros(nheights)
-    for (y, x), _ in np.ndenumerate(dem):
-        new_heights = np.linspace(dem[y, x], 15000, nheights)
-        interp1d_jit(height[y, x, :], temp[y, x, :], new_heights, itemp)
-        interp1d_jit(height[y, x, :], ppwv[y, x, :], new_heights, ippwv)
-        interp1d_jit(height[y, x, :], pressure[y, x, :], new_heights, ipressure)
-
-        # Convert pressures from hPa to Pa
-        ipressure *= 100
-        ippwv *= 100
-
-        wet_refract = ((k2 - (k1 * Rd / Rv)) * (ippwv / itemp)
-                       + (k3 * ippwv / (itemp**2)))
-        dry_refract = k1 * ipressure / itemp
-
-        # Convert delays to centimetres
-        out_wet[y, x] = 10**-6 * trapz(new_heights, wet_refract) * 100
-        out_dry[y, x] = 10**-6 * trapz(new_heights, dry_refract) * 100
+    wet_coeff = k2 - (k1 * Rd / Rv)
+    top = 15000.0
+
+    for y in numba.prange(dem.shape[0]):
+        # Caches for the sample heights, interpolated variables and
+        # refractivities. Allocated per row so that each thread has its own.
+        new_heights = np.empty(nheights)
+        itemp = np.empty(nheights)
+        ippwv = np.empty(nheights)
+        ipressure = np.empty(nheights)
+        wet_refract = np.empty(nheights)
+        dry_refract = np.empty(nheights)
+        for x in range(dem.shape[1]):
+            step = (top - dem[y, x]) / (nheights - 1)
+            for k in range(nheights - 1):
+                new_heights[k] = dem[y, x] + k * step
+            new_heights[nheights - 1] = top
+
+            interp1d_sorted_jit(height[y, x, :], temp[y, x, :], new_heights, itemp)
+            interp1d_sorted_jit(height[y, x, :], ppwv[y, x, :], new_heights, ippwv)
+            interp1d_sorted_jit(height[y, x, :], pressure[y, x, :], new_heights, ipressure)
+
+            # Refractivities in one pass with pressures converted from hPa to
+            # Pa.
+            for k in range(nheights):
+                inv_temp = 1.0 / itemp[k]
+                wet_refract[k] = (100 * ippwv[k] * inv_temp
+                                  * (wet_coeff + k3 * inv_temp))
+                dry_refract[k] = k1 * 100 * ipressure[k] * inv_temp
+
+            # Convert delays to centimetres
+            out_wet[y, x] = 10**-6 * simps(new_heights, wet_refract) * 100
+            out_dry[y, x] = 10**-6 * simps(new_heights, dry_refract) * 100
 
 
 def liquid_zenith_delay(lwc, cloud_thickness):
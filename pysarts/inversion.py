@@ -50,7 +50,8 @@ def calculate_inverse(ifg_paths, master_date, grid_shape, output_model):
     grid_shape : tuple
       The size of the grid the interferograms at `ifg_paths` are on.
     output_model : ndarray
-      A 3D matrix to save the inverted time series to. Basically this exists so
+      A 3D matrix to save the inverted time series to with the dates along the
+      first axis and `grid_shape` along the others. Basically this exists so
       you can pass a memory mapped matrix in. If you do use a memory mapped
       matrix, *make sure it's opened in 'w+' mode!*
 
@@ -67,19 +68,19 @@ def calculate_inverse(ifg_paths, master_date, grid_shape, output_model):
         logging.debug('Creating data matrix memory map')
         data = np.memmap(data_memmap_file, np.float,
                          mode='w+',
-                         shape=(grid_shape + (kernel.shape[0],)))
+                         shape=((kernel.shape[0],) + grid_shape))
         logging.debug('Created data matrix memory map')
 
         # Load interferograms
         logging.debug('Loading interferograms')
         for idx, path in enumerate(ifg_paths):
-            data[:, :, idx] = np.load(path)
+            data[idx] = np.load(path)
 
         # Reshape matrices so the inversion can be done for all pixels in one function
         #
         # Each column is a pixel starting from the top-left corner. Each row is
         # a SLC time in ascending order.
-        data = data.transpose(2, 0, 1).reshape(kernel.shape[0], -1)
+        data = data.reshape(kernel.shape[0], -1)
 
         # Solve the inverse problem
         logging.info('Solving for %d unknowns using %d knowns',
@@ -87,17 +88,17 @@ def calculate_inverse(ifg_paths, master_date, grid_shape, output_model):
                      data.size)
         # A note on the reshaping. The output of lstsq is a 2D matrix. Each
         # column is a pixel in an interferogram starting from the top-left. Each
-        # row is an SLC time in ascending order. We have to transpose the output
-        # first before reshaping it back into a 3D array.
-        output_model[:] = np.linalg.lstsq(kernel, data)[0].T.reshape(grid_shape + (-1,))
+        # row is an SLC time in ascending order, so it reshapes directly into a
+        # 3D array with time along the first axis.
+        output_model[:] = np.linalg.lstsq(kernel, data)[0].reshape((-1,) + grid_shape)
 
     new_ifg_dates = sorted(list(set([date for pairs in ifg_date_pairs for date in pairs])))
-    master_date_std = output_model[:, :, new_ifg_dates.index(master_date)].std()
+    master_date_std = output_model[new_ifg_dates.index(master_date)].std()
     if master_date_std > 100:
         logging.warn('Master date time series interferogram has a high standard '
                      'deviation (%.2f). Forcing to zeros. Exercise caution.',
                      master_date_std)
-        output_model[:, :, new_ifg_dates.index(master_date)] = 0
+        output_model[new_ifg_dates.index(master_date)] = 0
     return new_ifg_dates
 
 
@@ -1,18 +1,42 @@
 """Module for interactive plotting of interferograms.
 
 """
+import functools
+import hashlib
 import os
+import pickle
+import re
+import sys
 from datetime import date, datetime
 import logging
 from multiprocessing.pool import Pool
 from scipy.ndimage import gaussian_filter
 
+import matplotlib
+
+
+def _headless(argv):
+    """Whether plots will only be written to files, because there's no display
+    or the command line `argv` saves them with -o/--output."""
+    if (sys.platform.startswith('linux') and not os.environ.get('DISPLAY')
+            and not os.environ.get('WAYLAND_DISPLAY')):
+        return True
+
+    return any(arg.startswith(('-o', '--output')) for arg in argv)
+
+
+# Skip loading a GUI backend when it won't be used. This has to happen before
+# pyplot is imported.
+if 'MPLBACKEND' not in os.environ and _headless(
+        sys.argv[1:] if __name__ == '__main__' else []):
+    matplotlib.use('Agg')
+
 import matplotlib.cm as cm
+from matplotlib.colors import Normalize
+from matplotlib.collections import LineCollection, QuadMesh
 import matplotlib.dates as mpl_dates
 import matplotlib.pyplot as plt
-from mpl_toolkits.basemap import Basemap
 import numpy as np
-import yaml
 
 from . import inversion
 from . import insar
@@ -34,10 +58,445 @@ params = {
 
 plt.rcParams.update(params)
 
-COAST_DETAIL = 'f'
+# Basemap coastline resolution. None picks one from the extent of each plot.
+COAST_DETAIL = None
 FIGSIZE = None
 DPI = None
 
+# Save PNG files with `_save_png` even when `_savefig` isn't asked to. Set in
+# the worker processes of `_plot_many`.
+_FAST_PNG = False
+
+
+@functools.lru_cache(maxsize=8)
+def _get_basemap(llcrnrlon, llcrnrlat, urcrnrlon, urcrnrlat, resolution,
+                 projection='merc'):
+    """Return a Basemap for a bounding box.
+
+    Basemaps are cached since loading the coastline data is slow. They are
+    kept in memory and pickled to SCRATCH_DIR/basemap_cache so later runs can
+    skip building them too. The returned instance is shared so callers should
+    set `bmap.ax` before drawing.
+    """
+    # Importing basemap is slow, so only do it when a map is needed. Unpickling
+    # a cached map would import it anyway.
+    import mpl_toolkits.basemap
+    from mpl_toolkits.basemap import Basemap
+
+    # Pickles only load reliably with the versions that wrote them
+    key = (llcrnrlon, llcrnrlat, urcrnrlon, urcrnrlat, resolution, projection,
+           mpl_toolkits.basemap.__version__, matplotlib.__version__)
+    cache_dir = os.path.join(config.SCRATCH_DIR, 'basemap_cache')
+    cache_path = os.path.join(cache_dir,
+                              hashlib.sha1(repr(key).encode()).hexdigest()
+                              + '.pkl')
+    try:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError,
+            ImportError) as e:
+        if not isinstance(e, FileNotFoundError):
+            logging.debug('Rebuilding basemap, could not load %s: %s',
+                          cache_path, e)
+
+    bmap = Basemap(llcrnrlon=llcrnrlon,
+                   llcrnrlat=llcrnrlat,
+                   urcrnrlon=urcrnrlon,
+                   urcrnrlat=urcrnrlat,
+                   resolution=resolution,
+                   projection=projection)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + '.{}.tmp'.format(os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(bmap, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logging.debug('Could not cache basemap: %s', e)
+
+    return bmap
+
+
+def _coast_detail(lons, lats):
+    """Coastline resolution for a map of `lons` by `lats`.
+
+    Returns `COAST_DETAIL` if it is set. Otherwise large maps get coarser
+    coastlines, which load much faster and look the same at figure size.
+    """
+    if COAST_DETAIL is not None:
+        return COAST_DETAIL
+
+    extent = max(abs(float(lons[-1]) - float(lons[0])),
+                 abs(float(lats[-1]) - float(lats[0])))
+    if extent > 5:
+        return 'i'
+    elif extent > 1:
+        return 'h'
+
+    return 'f'
+
+
+def _grid(path):
+    """Read the grid file at `path`, returning read-only (lons, lats).
+
+    The file is only parsed again if it has been modified since the last read.
+    """
+    return _cached_read_grid(path, os.path.getmtime(path))
+
+
+@functools.lru_cache(maxsize=8)
+def _cached_read_grid(path, mtime):
+    lons, lats = workflow.read_grid_from_file(path)
+    lons.setflags(write=False)
+    lats.setflags(write=False)
+
+    return (lons, lats)
+
+
+def _gridlines(lons, lats, n=5):
+    """Return `n` evenly spaced (parallels, meridians) spanning the grid."""
+    return _cached_gridlines(float(lons[0]), float(lons[-1]),
+                             float(lats[0]), float(lats[-1]), n)
+
+
+@functools.lru_cache(maxsize=16)
+def _cached_gridlines(lon0, lon1, lat0, lat1, n):
+    return (tuple(np.linspace(lat0, lat1, n).tolist()),
+            tuple(np.linspace(lon0, lon1, n).tolist()))
+
+
+@functools.lru_cache(maxsize=16)
+def _water_mask(path):
+    """Read-only boolean mask of the zero (water) pixels of the interferogram
+    saved at `path`."""
+    mask = np.load(path, mmap_mode='r') == 0
+    mask.setflags(write=False)
+
+    return mask
+
+
+def _mask_water(data, ifg_path):
+    """Add the water mask of the interferogram at `ifg_path` to the mask of the
+    masked array `data` in place."""
+    water = _water_mask(ifg_path)
+    if data.mask is np.ma.nomask:
+        # Assigning copies, so the cached mask isn't shared
+        data.mask = water
+    else:
+        np.logical_or(data.mask, water, out=data.mask)
+
+
+def _abs_max(data):
+    """Largest absolute value in `data` without forming `abs(data)`.
+
+    Masked values in masked arrays are ignored.
+    """
+    return float(max(-np.ma.min(data), np.ma.max(data)))
+
+
+def _nearest_index(values, value):
+    """Index of the element of the strictly ascending array `values` closest to
+    `value`.
+
+    Ties go to the lower index, like `np.argmin(np.absolute(values - value))`.
+    """
+    idx = int(np.searchsorted(values, value))
+    if idx == 0:
+        return 0
+    if idx == len(values):
+        return idx - 1
+    if value - values[idx - 1] <= values[idx] - value:
+        return idx - 1
+    return idx
+
+
+def _regular_grid(lons, lats, rtol=1e-2, atol=1e-6):
+    """Check whether `lons` and `lats` are both evenly spaced.
+
+    The spacing may vary by `rtol` of the first spacing, which allows for grids
+    stored in single precision.
+    """
+    return all(axis.size < 2 or np.allclose(np.diff(axis), axis[1] - axis[0],
+                                            rtol=rtol, atol=atol)
+               for axis in (np.asarray(lons, dtype=float),
+                            np.asarray(lats, dtype=float)))
+
+
+def _image_grid(bmap, lons, lats):
+    """Check whether gridded data can be drawn on `bmap` as a single image.
+
+    That needs a regular grid and a projection where map x only depends on
+    longitude and y only on latitude.
+    """
+    return (bmap.projection in ('merc', 'cyl') and len(lons) > 1
+            and len(lats) > 1 and _regular_grid(lons, lats))
+
+
+def _cell_edges(centres):
+    """Edges of the grid cells around the ascending or descending `centres`."""
+    edges = np.empty(centres.size + 1)
+    edges[1:-1] = (centres[1:] + centres[:-1]) / 2
+    edges[0] = centres[0] - (centres[1] - centres[0]) / 2
+    edges[-1] = centres[-1] + (centres[-1] - centres[-2]) / 2
+
+    return edges
+
+
+def _image_rows(bmap, lons, lats):
+    """Work out how to draw a grid accepted by `_image_grid` as an image.
+
+    Projected y isn't linear in latitude for every projection (Mercator
+    stretches towards the poles), so the image rows are evenly spaced in y
+    and each shows the grid row whose cell covers the row's centre.
+
+    Returns the grid row to show in each image row, or `None` if they are
+    the grid's own rows, and the (x0, x1, y0, y1) extent of the image.
+    """
+    lon_edges = _cell_edges(np.asarray(lons, dtype=float))
+    lat_edges = _cell_edges(np.asarray(lats, dtype=float))
+    x, _ = bmap(lon_edges[[0, -1]], np.full(2, lat_edges[0]))
+    _, y = bmap(np.full(lat_edges.shape, lon_edges[0]), lat_edges)
+    y = np.asarray(y, dtype=float)
+
+    nrows = lat_edges.size - 1
+    step = (y[-1] - y[0]) / nrows
+    centres = y[0] + step * (np.arange(nrows) + 0.5)
+    if y[-1] < y[0]:
+        rows = nrows - np.searchsorted(y[::-1], centres, side='right')
+    else:
+        rows = np.searchsorted(y, centres, side='right') - 1
+    rows = np.clip(rows, 0, nrows - 1)
+    if np.array_equal(rows, np.arange(nrows)):
+        rows = None
+
+    return rows, (x[0], x[-1], y[0], y[-1])
+
+
+def _draw_grid(bmap, lons, lats, data, **kwargs):
+    """Draw gridded `data` on `bmap`, returning the image.
+
+    Grids accepted by `_image_grid` are drawn with a single image spanning the
+    grid, which is much faster than a mesh with one quad per pixel. Other
+    grids fall back to `pcolormesh`. `kwargs` are passed on to the drawing
+    function.
+    """
+    # Keep the data as one embedded image in vector output, rather than a path
+    # per pixel. Coastlines and labels stay as vectors.
+    kwargs.setdefault('rasterized', True)
+    if _image_grid(bmap, lons, lats):
+        rows, extent = _image_rows(bmap, lons, lats)
+        if rows is not None:
+            data = data[rows]
+        return bmap.imshow(data, extent=extent, origin='lower',
+                           interpolation='nearest', **kwargs)
+
+    if bmap.projection in ('merc', 'cyl'):
+        # Map x only depends on longitude and y only on latitude for these
+        # projections, so project the axes and let pcolormesh take them 1D.
+        lons, lats = np.asarray(lons), np.asarray(lats)
+        x, _ = bmap(lons, np.full(lons.shape, lats[0]))
+        _, y = bmap(np.full(lats.shape, lons[0]), lats)
+        return bmap.pcolormesh(x, y, data, **kwargs)
+
+    # Project broadcast views of the axes rather than building a meshgrid of
+    # them first.
+    lons, lats = np.asarray(lons), np.asarray(lats)
+    x, y = bmap(*np.broadcast_arrays(lons[np.newaxis, :], lats[:, np.newaxis]))
+    return bmap.pcolormesh(x, y, data, **kwargs)
+
+
+def _savefig(fig, fname, fast_png=False):
+    """Save `fig` to `fname` cropped to its contents.
+
+    Gridded data is rasterized in vector formats, so unless `DPI` is set those
+    are saved at 300 dpi to keep the embedded image sharp.
+
+    With `fast_png` PNG files are written by `_save_png`, which is quicker but
+    makes larger files. It is meant for plotting many files in one go.
+    """
+    ext = os.path.splitext(fname)[1].lower()
+    if ext == '.png' and (fast_png or _FAST_PNG) and _save_png(fig, fname):
+        return
+
+    kwargs = {}
+    if DPI is None and ext in ('.pdf', '.svg', '.svgz', '.eps', '.ps'):
+        kwargs['dpi'] = 300
+
+    fig.savefig(fname, bbox_inches='tight', **kwargs)
+
+
+def _save_png(fig, fname):
+    """Write `fig` to the PNG file `fname` straight from the Agg canvas.
+
+    The image is cropped the same way as `savefig(bbox_inches='tight')` but the
+    figure is only drawn once and the PNG is compressed lightly, which is
+    quicker. Returns False without writing anything if Pillow is missing or
+    the figure can't be saved this way.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+
+    canvas = fig.canvas
+    if (not hasattr(canvas, 'buffer_rgba')
+            or plt.rcParams['savefig.dpi'] not in ('figure', fig.dpi)):
+        return False
+
+    canvas.draw()
+    renderer = canvas.get_renderer()
+    width, height = int(renderer.width), int(renderer.height)
+    pixels = np.frombuffer(canvas.buffer_rgba(), np.uint8)
+    pixels = pixels.reshape(height, width, 4)
+
+    # Tight bounding box in pixels from the bottom left, sized like the
+    # canvas savefig would make for it.
+    bbox = fig.get_tightbbox(renderer).padded(plt.rcParams['savefig.pad_inches'])
+    x0 = max(int(round(bbox.x0 * fig.dpi)), 0)
+    x1 = min(x0 + int(bbox.width * fig.dpi), width)
+    y0 = max(int(round(bbox.y0 * fig.dpi)), 0)
+    y1 = min(y0 + int(bbox.height * fig.dpi), height)
+
+    image = Image.fromarray(pixels[height - y1:height - y0, x0:x1], 'RGBA')
+    image.save(fname, 'PNG', compress_level=1, dpi=(fig.dpi, fig.dpi))
+
+    return True
+
+
+def _kind_output(output, kind):
+    """Insert `kind` before the extension of the `output` file name."""
+    if not output:
+        return output
+
+    comps = os.path.splitext(output)
+    return comps[0] + '_' + kind + comps[1]
+
+
+def _init_plot_worker(fast_png=False):
+    """Use a non-interactive backend in plotting worker processes.
+
+    With `fast_png` the worker saves PNG files with `_save_png`.
+    """
+    global _FAST_PNG
+    plt.switch_backend('Agg')
+    _FAST_PNG = fast_png
+
+
+def _plot_many(plot_func, tasks):
+    """Call `plot_func` with each tuple of arguments in `tasks`.
+
+    The last argument of each task is the output file name. When every task
+    saves to a file the plots are rendered in parallel, otherwise they are
+    shown one after another.
+    """
+    if len(tasks) > 1 and all(task[-1] for task in tasks):
+        nprocesses = min(len(tasks), os.cpu_count() or 1)
+        with Pool(nprocesses, initializer=_init_plot_worker,
+                  initargs=(True,)) as p:
+            p.starmap(plot_func, tasks, chunksize=1)
+    else:
+        for task in tasks:
+            plot_func(*task)
+
+
+def _open_ifg_nc(path):
+    """Load an interferogram NetCDF file as an `insar.InSAR` instance.
+
+    The file is read with xarray's h5netcdf engine when both are installed,
+    which avoids netCDF4's per-variable metadata queries. Otherwise this falls
+    back to `insar.InSAR.from_netcdf`. The same variable layouts are supported
+    and the data is masked the same way.
+    """
+    try:
+        import xarray
+        import h5netcdf  # noqa: F401
+    except ImportError:
+        return insar.InSAR.from_netcdf(path)
+
+    # Chunking needs dask, which is optional too.
+    try:
+        import dask  # noqa: F401
+        chunks = {'lat': 512, 'lon': 512}
+    except ImportError:
+        chunks = None
+
+    master_date, slave_date = util.extract_timestamp_from_ifg_name(path)
+    try:
+        with xarray.open_dataset(path, engine='h5netcdf', chunks=chunks,
+                                 decode_cf=False) as df:
+            if 'Band1' in df.variables:
+                # ISCE GDAL converted NetCDF
+                lons, lats = df['lon'].values, df['lat'].values
+                data = _netcdf4_values(df['Band1'])
+            elif 'delay' in df.variables:
+                # pysarts generated NetCDF
+                lons, lats = df['lon'].values, df['lat'].values
+                data = _netcdf4_values(df['delay'])
+            else:
+                # Generic NetCDF
+                lons, lats = df['x'].values, df['y'].values
+                data = _netcdf4_values(df['z'], mask=False)
+    except (OSError, ValueError):
+        # Not an HDF5 based (NetCDF4) file.
+        return insar.InSAR.from_netcdf(path)
+
+    return insar.InSAR(lons, lats, data, master_date, slave_date)
+
+
+def _netcdf4_values(var, mask=True):
+    """Return the values of the undecoded xarray variable `var` as netCDF4
+    would read them.
+
+    Values equal to `missing_value` or the fill value, or outside `valid_range`
+    (or `valid_min` and `valid_max`), are masked. The fill value defaults to
+    netCDF4's default for the type, except for bytes. `scale_factor` and
+    `add_offset` are applied afterwards. Without `mask` a plain ndarray is
+    returned like the `data` of netCDF4's masked array, which keeps the
+    unscaled values where they are masked.
+    """
+    from netCDF4 import default_fillvals
+
+    raw = np.asarray(var.values)
+    attrs = var.attrs
+    dtype = raw.dtype
+    invalid = np.zeros(raw.shape, dtype=bool)
+    if dtype.kind != 'S':
+        fill = attrs.get('_FillValue')
+        if fill is None and dtype.str[1:] not in ('i1', 'u1'):
+            fill = default_fillvals.get(dtype.str[1:])
+
+        missing = attrs.get('missing_value')
+        values = [] if missing is None else list(np.atleast_1d(missing))
+        if fill is not None:
+            values.append(fill)
+
+        for value in np.array(values, dtype=dtype):
+            # NaN fill values never compare equal
+            invalid |= np.isnan(raw) if value != value else raw == value
+
+        valid_range = attrs.get('valid_range')
+        if valid_range is not None and np.size(valid_range) == 2:
+            valid_min, valid_max = valid_range
+        else:
+            valid_min, valid_max = attrs.get('valid_min'), attrs.get('valid_max')
+
+        if valid_min is not None:
+            invalid |= raw < np.array(valid_min, dtype=dtype)
+        if valid_max is not None:
+            invalid |= raw > np.array(valid_max, dtype=dtype)
+
+    data = raw
+    if 'scale_factor' in attrs:
+        data = data * attrs['scale_factor']
+    if 'add_offset' in attrs:
+        data = data + attrs['add_offset']
+
+    if mask:
+        return np.ma.masked_array(data, mask=invalid)
+
+    return np.where(invalid, raw, data).astype(data.dtype, copy=False)
+
 
 def _parse_unwrapped_ifg_args(args):
     if args.time_series:
@@ -79,9 +538,8 @@ def plot_unwrapped_ifg(master_date, slave_date, fname=None, kind='original'):
     ifg = None
     if kind == 'resampled':
         ifg_path = os.path.join(config.SCRATCH_DIR, 'uifg_resampled', ifg_name + '.npy')
-        data = np.load(ifg_path)
-        lons, lats = workflow.read_grid_from_file(os.path.join(config.SCRATCH_DIR,
-                                                               'grid.txt'))
+        data = np.load(ifg_path, mmap_mode='r')
+        lons, lats = _grid(os.path.join(config.SCRATCH_DIR, 'grid.txt'))
 
         ifg = insar.InSAR(lons,
                           lats,
@@ -90,16 +548,16 @@ def plot_unwrapped_ifg(master_date, slave_date, fname=None, kind='original'):
                           datetime.strptime(slave_date, '%Y%m%d').date())
     elif kind == 'original':
         ifg_path = os.path.join(config.UIFG_DIR, ifg_name + '.nc')
-        ifg = insar.InSAR.from_netcdf(ifg_path)
+        ifg = _open_ifg_nc(ifg_path)
     elif kind == 'corrected':
         ifg_path = os.path.join(config.SCRATCH_DIR, 'corrected_ifg', ifg_name + '.nc')
-        ifg = insar.InSAR.from_netcdf(ifg_path)
+        ifg = _open_ifg_nc(ifg_path)
     else:
         raise ValueError('Unknown plotting mode {}'.format(kind))
 
-    fig, _ = plot_ifg(ifg)
+    fig, _ = plot_ifg(ifg, apply_layout=not fname)
     if fname:
-        fig.savefig(fname, bbox_inches='tight')
+        _savefig(fig, fname)
         plt.close()
     else:
         plt.show()
@@ -108,9 +566,13 @@ def plot_unwrapped_ifg(master_date, slave_date, fname=None, kind='original'):
     return None
 
 
-def plot_ifg(ifg, axes=None, center_zero=True):
+def plot_ifg(ifg, axes=None, center_zero=True, apply_layout=True):
     """Plot an insar.InSAR instance or an insar.SAR instance. Returns a figure
-    handle"""
+    handle
+
+    Set `apply_layout` to False to skip `tight_layout` when the figure will be
+    saved with `bbox_inches='tight'`, which saves drawing the figure twice.
+    """
 
     if axes:
         fig = axes.get_figure()
@@ -118,15 +580,11 @@ def plot_ifg(ifg, axes=None, center_zero=True):
         fig = plt.figure(dpi=DPI, figsize=FIGSIZE)
         axes = fig.add_subplot(1, 1, 1)
 
-    bmap = Basemap(llcrnrlon=ifg.lons[0],
-                   llcrnrlat=ifg.lats[0],
-                   urcrnrlon=ifg.lons[-1],
-                   urcrnrlat=ifg.lats[-1],
-                   resolution=COAST_DETAIL,
-                   projection='merc',
-                   ax=axes)
-    parallels = np.linspace(ifg.lats[0], ifg.lats[-1], 5)
-    meridians = np.linspace(ifg.lons[0], ifg.lons[-1], 5)
+    bmap = _get_basemap(float(ifg.lons[0]), float(ifg.lats[0]),
+                        float(ifg.lons[-1]), float(ifg.lats[-1]),
+                        _coast_detail(ifg.lons, ifg.lats))
+    bmap.ax = axes
+    parallels, meridians = _gridlines(ifg.lons, ifg.lats)
 
     bmap.drawcoastlines()
     bmap.drawparallels(parallels, labels=[True, False, False, False],
@@ -135,26 +593,14 @@ def plot_ifg(ifg, axes=None, center_zero=True):
                        fmt="%.2f", fontsize=plt.rcParams['xtick.labelsize'])
     bmap.drawmapboundary()
 
-    vmax = (np.absolute(ifg.data).max())
+    vmax = _abs_max(ifg.data)
     vmin = vmax * -1
 
-    lon_mesh, lat_mesh = np.meshgrid(ifg.lons, ifg.lats)
-
-    image = None
     if center_zero is True:
-        image = bmap.pcolormesh(lon_mesh,
-                                lat_mesh,
-                                ifg.data,
-                                latlon=True,
-                                cmap=cm.RdBu_r,
-                                vmin=vmin,
-                                vmax=vmax)
+        image = _draw_grid(bmap, ifg.lons, ifg.lats, ifg.data,
+                           cmap=cm.RdBu_r, vmin=vmin, vmax=vmax)
     else:
-        image = bmap.pcolormesh(lon_mesh,
-                                lat_mesh,
-                                ifg.data,
-                                latlon=True,
-                                cmap=cm.RdBu_r,)
+        image = _draw_grid(bmap, ifg.lons, ifg.lats, ifg.data, cmap=cm.RdBu_r)
 
     cbar = fig.colorbar(image, pad=0.07, ax=axes)
     cbar.set_label('LOS Delay / cm')
@@ -168,7 +614,8 @@ def plot_ifg(ifg, axes=None, center_zero=True):
         title = 'SAR Image ({})'.format(ifg.date.strftime('%Y-%m-%d'))
         axes.set_title(title)
 
-    fig.tight_layout()
+    if apply_layout:
+        fig.tight_layout()
 
     return fig, bmap
 
@@ -180,29 +627,21 @@ def plot_time_series_ifg(master_date, slave_date, fname=None):
     if isinstance(slave_date, date):
         slave_date = slave_date.strftime('%Y%m%d')
 
-    lons, lats = workflow.read_grid_from_file(os.path.join(config.SCRATCH_DIR,
-                                                           'grid.txt'))
-    ifg_ts = np.load(os.path.join(config.SCRATCH_DIR,
-                                  'uifg_ts',
-                                  master_date + '.npy'),
-                     mmap_mode='r')
-    slave_date_idx = 0
-    with open(os.path.join(config.SCRATCH_DIR,
-                           'uifg_ts',
-                           master_date + '.yml')) as f:
-        ts_date_indexes = yaml.safe_load(f)
-        slave_date_date = datetime.strptime(slave_date, '%Y%m%d').date()
-        slave_date_idx = ts_date_indexes.index(slave_date_date)
+    lons, lats = _grid(os.path.join(config.SCRATCH_DIR, 'grid.txt'))
+    ifg_ts, ts_date_indexes = workflow.load_uifg_ts(master_date,
+                                                    (len(lats), len(lons)))
+    slave_date_date = datetime.strptime(slave_date, '%Y%m%d').date()
+    slave_date_idx = ts_date_indexes.index(slave_date_date)
 
     ifg = insar.InSAR(lons,
                       lats,
-                      ifg_ts[:, :, slave_date_idx],
+                      ifg_ts[slave_date_idx],
                       datetime.strptime(master_date, '%Y%m%d').date(),
                       datetime.strptime(slave_date, '%Y%m%d').date())
 
-    fig, _ = plot_ifg(ifg)
+    fig, _ = plot_ifg(ifg, apply_layout=not fname)
     if fname:
-        fig.savefig(fname, bbox_inches='tight')
+        _savefig(fig, fname)
     else:
         plt.show()
         plt.close()
@@ -223,20 +662,19 @@ def plot_dem_error(master_date, fname=None):
                                      'dem_error',
                                      master_date + '.npy'),
                         mmap_mode='r')
-    lons, lats = workflow.read_grid_from_file(os.path.join(config.SCRATCH_DIR,
-                                                           'grid.txt'))
+    lons, lats = _grid(os.path.join(config.SCRATCH_DIR, 'grid.txt'))
 
     sar = insar.SAR(lons,
                     lats,
                     dem_error,
                     datetime.strptime(master_date, '%Y%m%d').date())
 
-    fig, _ = plot_ifg(sar)
+    fig, _ = plot_ifg(sar, apply_layout=not fname)
     axes = fig.get_axes()[0]
     axes.set_title('DEM Error\n{}'
                    .format(sar.date.strftime('%Y-%m-%d')))
     if fname:
-        fig.savefig(fname, bbox_inches='tight')
+        _savefig(fig, fname)
     else:
         plt.show()
 
@@ -259,18 +697,17 @@ def plot_master_atmosphere(master_date, fname=None):
                                              'master_atmosphere',
                                              master_date + '.npy'),
                                 mmap_mode='r')
-    lons, lats = workflow.read_grid_from_file(os.path.join(config.SCRATCH_DIR,
-                                                           'grid.txt'))
+    lons, lats = _grid(os.path.join(config.SCRATCH_DIR, 'grid.txt'))
 
     sar = insar.SAR(lons,
                     lats,
                     master_atmosphere,
                     datetime.strptime(master_date, '%Y%m%d').date())
 
-    fig, _ = plot_ifg(sar)
+    fig, _ = plot_ifg(sar, apply_layout=not fname)
     axes = fig.get_axes()[0]
     if fname:
-        fig.savefig(fname, bbox_inches='tight')
+        _savefig(fig, fname)
     else:
         axes.set_title('Master Atmosphere\n{}'
                        .format(sar.date.strftime('%Y-%m-%d')))
@@ -293,12 +730,11 @@ def plot_delay_rainfall_scatter(date, fname=None):
                               date.strftime('%Y%m%d') + '.npy')
     _, wr_path = workflow.find_closest_weather_radar_files(date)
 
-    atmos = np.load(atmos_path)
+    atmos = np.load(atmos_path, mmap_mode='r')
     wr = nimrod.Nimrod.from_netcdf(wr_path)
 
     # Load in the grid and resample the weather radar image to it.
-    lons, lats = workflow.read_grid_from_file(os.path.join(config.SCRATCH_DIR,
-                                                           'grid.txt'))
+    lons, lats = _grid(os.path.join(config.SCRATCH_DIR, 'grid.txt'))
     lon_min, lon_max = lons.min(), lons.max()
     lat_min, lat_max = lats.min(), lats.max()
     lon_bounds = (lon_min - 0.5, lon_max + 0.5)
@@ -317,32 +753,28 @@ def plot_delay_rainfall_scatter(date, fname=None):
                    .format(date.strftime('%Y-%m-%d')))
 
     if fname:
-        fig.savefig(fname, bbox_inches='tight')
+        _savefig(fig, fname)
     else:
         plt.show()
 
     plt.close()
 
 
-def plot_wr(wr, axes=None):
+def plot_wr(wr, axes=None, apply_layout=True):
     """Plot a `nimrod.Nimrod` instance. Returns a figure handle and a basemap
-    object."""
+    object. See `plot_ifg` for `apply_layout`."""
     if axes:
         fig = axes.get_figure()
     else:
         fig = plt.figure(dpi=DPI, figsize=FIGSIZE)
         axes = fig.add_subplot(1, 1, 1)
 
-    bmap = Basemap(llcrnrlon=wr.lons[0],
-                   llcrnrlat=wr.lats[0],
-                   urcrnrlon=wr.lons[-1],
-                   urcrnrlat=wr.lats[-1],
-                   resolution=COAST_DETAIL,
-                   projection='merc',
-                   ax=axes)
+    bmap = _get_basemap(float(wr.lons[0]), float(wr.lats[0]),
+                        float(wr.lons[-1]), float(wr.lats[-1]),
+                        _coast_detail(wr.lons, wr.lats))
+    bmap.ax = axes
 
-    parallels = np.linspace(wr.lats[0], wr.lats[-1], 5)
-    meridians = np.linspace(wr.lons[0], wr.lons[-1], 5)
+    parallels, meridians = _gridlines(wr.lons, wr.lats)
 
     bmap.drawcoastlines()
     bmap.drawparallels(parallels, labels=[True, False, False, False],
@@ -351,13 +783,8 @@ def plot_wr(wr, axes=None):
                        fmt="%.2f", fontsize=plt.rcParams['xtick.labelsize'])
     bmap.drawmapboundary()
 
-    lon_mesh, lat_mesh = np.meshgrid(wr.lons, wr.lats)
-    image = bmap.pcolormesh(lon_mesh,
-                            lat_mesh,
-                            np.ma.masked_values(wr.data, 0),
-                            latlon=True,
-                            cmap=cm.Spectral_r,
-                            vmin=0)
+    image = _draw_grid(bmap, wr.lons, wr.lats, np.ma.masked_values(wr.data, 0),
+                       cmap=cm.Spectral_r, vmin=0)
 
     cbar = fig.colorbar(image, pad=0.07, ax=axes)
     cbar.set_label(r'Rainfall / mm hr$^{-1}$')
@@ -370,7 +797,8 @@ def plot_wr(wr, axes=None):
                  .format(wr.date.strftime('%Y-%m-%dT%H:%M')))
 
     axes.set_title(title)
-    fig.tight_layout()
+    if apply_layout:
+        fig.tight_layout()
 
     return (fig, bmap)
 
@@ -388,17 +816,15 @@ def plot_weather(wr_date, full=False, fname=None):
     if isinstance(wr_date, str):
         wr_date = datetime.strptime(wr_date, '%Y%m%dT%H%M')
 
-    # Load the weather radar image
-    wr_before, wr_after = workflow.find_closest_weather_radar_files(wr_date)
+    # Load the weather radar image. Only the image after the date is plotted,
+    # so the one before isn't read.
+    wr_before_path, wr_after_path = workflow.find_closest_weather_radar_files(wr_date)
 
-    if wr_before != wr_after:
-        logging.warning('Found two different radar images near %s. Interpolating',
-                        wr_date)
+    if wr_before_path != wr_after_path:
+        logging.warning('Found two different radar images near %s. Using the '
+                        'one after', wr_date)
 
-    wr_before = nimrod.Nimrod.from_netcdf(wr_before)
-    wr_after = nimrod.Nimrod.from_netcdf(wr_after)
-    # wr = nimrod.Nimrod.interp_radar(wr_before, wr_after, wr_date)
-    wr = wr_after
+    wr = nimrod.Nimrod.from_netcdf(wr_after_path)
 
     if not full:
         # Clip image to target region
@@ -406,10 +832,10 @@ def plot_weather(wr_date, full=False, fname=None):
         lat_bounds = (config.REGION['lat_min'], config.REGION['lat_max'])
         wr.clip(lon_bounds, lat_bounds)
 
-    fig, _ = plot_wr(wr)
+    fig, _ = plot_wr(wr, apply_layout=not fname)
 
     if fname:
-        fig.savefig(fname, bbox_inches='tight')
+        _savefig(fig, fname)
     else:
         plt.show()
         plt.close()
@@ -439,8 +865,7 @@ def plot_profile(master_date, longitude, filter_std, fname=None):
                                              'master_atmosphere',
                                              master_date.strftime('%Y%m%d') + '.npy'),
                                 mmap_mode='r')
-    lons, lats = workflow.read_grid_from_file(os.path.join(config.SCRATCH_DIR,
-                                                           'grid.txt'))
+    lons, lats = _grid(os.path.join(config.SCRATCH_DIR, 'grid.txt'))
 
     sar = insar.SAR(lons,
                     lats,
@@ -456,7 +881,10 @@ def plot_profile(master_date, longitude, filter_std, fname=None):
 
     wr.clip(lon_bounds, lat_bounds)
     wr.interp(sar.lons, sar.lats, method='nearest')
-    wr.data = gaussian_filter(wr.data, filter_std)
+    # Smoothing is only for display so single precision and a slightly shorter
+    # kernel are plenty.
+    wr.data = gaussian_filter(np.ascontiguousarray(wr.data, dtype=np.float32),
+                              filter_std, truncate=3.0, mode='nearest')
 
     # Plot and configure sar
     _, bmap_sar = plot_ifg(sar, axes=sar_ax)
@@ -471,8 +899,8 @@ def plot_profile(master_date, longitude, filter_std, fname=None):
 
     # Plot the profile
     ## LOS Delay
-    sar_lon_idx = np.argmin(np.absolute(sar.lons - longitude))
-    wr_lon_idx = np.argmin(np.absolute(wr.lons - longitude))
+    sar_lon_idx = _nearest_index(sar.lons, longitude)
+    wr_lon_idx = _nearest_index(wr.lons, longitude)
     profile_ax.plot(sar.lats, sar.data[:, sar_lon_idx], color='#67a9cf')
     profile_ax.tick_params('y', colors='#67a9cf')
     profile_ax.set_ylabel('LOS Delay / cm')
@@ -487,7 +915,7 @@ def plot_profile(master_date, longitude, filter_std, fname=None):
     profile_ax_rain.grid(b=False)
 
     if fname:
-        fig.savefig(fname, bbox_inches='tight')
+        _savefig(fig, fname)
     else:
         plt.show()
         plt.close()
@@ -509,9 +937,7 @@ def plot_baseline_plot(master_date, fname=None):
 
     baseline_list = inversion.calculate_inverse_bperp(config.BPERP_FILE_PATH,
                                                       master_date)
-    baseline_list = list(baseline_list)
-    slave_dates = [date for (date, _) in baseline_list]
-    baselines = [baseline for (_, baseline) in baseline_list]
+    baseline_of = dict(baseline_list)
     bperp_contents = inversion.read_bperp_file(config.BPERP_FILE_PATH)
     ifg_master_dates = [date for (date, _, _) in bperp_contents]
     ifg_slave_dates = [date for (_, date, _) in bperp_contents]
@@ -521,38 +947,34 @@ def plot_baseline_plot(master_date, fname=None):
     fig = plt.figure(dpi=DPI, figsize=FIGSIZE)
     axes = fig.add_subplot(1, 1, 1)
 
-    # Plot lines connecting dates for interferograms
+    # Plot lines connecting dates for interferograms. All pairings are drawn as
+    # segments of one collection rather than one line each.
     line_color = axes._get_lines.get_next_color()
-    line = None
-    for (master, slave) in zip(ifg_master_dates, ifg_slave_dates):
-        master_perp_base = baselines[slave_dates.index(master)]
-        slave_perp_base = baselines[slave_dates.index(slave)]
-
-        line = axes.plot_date([master, slave],
-                              [master_perp_base, slave_perp_base],
-                              '-',
-                              linewidth=0.5,
-                              color=line_color,
-                              label='Interferogram Pairing')
+    segments = np.empty((len(ifg_master_dates), 2, 2))
+    segments[:, 0, 0] = mpl_dates.date2num(ifg_master_dates)
+    segments[:, 1, 0] = mpl_dates.date2num(ifg_slave_dates)
+    segments[:, 0, 1] = [baseline_of[date] for date in ifg_master_dates]
+    segments[:, 1, 1] = [baseline_of[date] for date in ifg_slave_dates]
+    lines = LineCollection(segments, linewidths=0.5, colors=line_color,
+                           label='Interferogram Pairing')
+    axes.add_collection(lines)
+    axes.xaxis_date()
 
     # Plot Acquisitions
-    xs = []  # Time baseline in days
-    ys = []  # Perpendicular baseline in metres
-    for slc_date in slc_dates:
-        xs += [slc_date]
-        ys += [baselines[slave_dates.index(slc_date)]]
-
-    points = axes.plot_date(xs, ys, label='Acquisition')
+    points = axes.plot_date(slc_dates,
+                            [baseline_of[date] for date in slc_dates],
+                            label='Acquisition')
 
     # Axes styling
-    axes.legend(handles=[points[0], line[0]])
+    axes.autoscale_view()
+    axes.legend(handles=[points[0], lines])
     axes.set_xlabel('Date')
     axes.set_ylabel('Perpendicular Baseline / m')
     axes.set_title('Baseline Plot')
     axes.xaxis.set_major_formatter(mpl_dates.DateFormatter('%Y-%b'))
 
     if fname:
-        fig.savefig(fname, bbox_inches='tight')
+        _savefig(fig, fname)
     else:
         plt.show()
 
@@ -566,29 +988,13 @@ def _plot_train_sar_delay(args):
         exit(1)
 
     date = args.date if args.date else config.MASTER_DATE
-    if args.hydrostatic:
-        output = args.output
-        if output:
-            comps = os.path.splitext(output)
-            output = comps[0] + '_hydro' + comps[1]
-
-        plot_train_sar_delay(date, kind='hydro', output=output)
-
-    if args.wet:
-        output = args.output
-        if output:
-            comps = os.path.splitext(output)
-            output = comps[0] + '_wet' + comps[1]
-
-        plot_train_sar_delay(date, kind='wet', output=output)
-
-    if args.total:
-        output = args.output
-        if output:
-            comps = os.path.splitext(output)
-            output = comps[0] + '_total' + comps[1]
+    tasks = []
+    for (flag, kind) in ((args.hydrostatic, 'hydro'), (args.wet, 'wet'),
+                         (args.total, 'total')):
+        if flag:
+            tasks += [(date, kind, _kind_output(args.output, kind))]
 
-        plot_train_sar_delay(date, kind='total', output=output)
+    _plot_many(plot_train_sar_delay, tasks)
 
 
 def plot_train_sar_delay(master_date, kind='total', output=None):
@@ -611,35 +1017,34 @@ def plot_train_sar_delay(master_date, kind='total', output=None):
     delay_fpath = os.path.join(era_dir, master_datestamp + '.mat')
 
     era_delays = train.load_train_slant_delay(delay_fpath)
-    data = np.zeros(era_delays['wet_delay'].shape)
     if kind == 'wet':
-        data[:, :] = era_delays['wet_delay']
+        data = era_delays['wet_delay']
     elif kind == 'hydro':
-        data[:, :] = era_delays['hydro_delay']
+        data = era_delays['hydro_delay']
     elif kind == 'total':
-        data[:, :] = era_delays['wet_delay'] + era_delays['hydro_delay']
+        data = era_delays['wet_delay'] + era_delays['hydro_delay']
     else:
         raise KeyError('Unknown kind {}'.format(kind))
 
-    # Mask the data to remove NaNs
-    data = np.ma.masked_invalid(data)
+    # Single precision is plenty for a colour map and halves the work of
+    # masking and drawing. Mask the data to remove NaNs.
+    data = np.ma.masked_invalid(np.ascontiguousarray(data, dtype=np.float32),
+                                copy=False)
 
     # Get a mask for water from one of the interferograms
     ifg_path = os.path.join(config.SCRATCH_DIR,
                             'master_atmosphere',
                             config.MASTER_DATE.strftime('%Y%m%d') + '.npy')
-    ifg_data = np.load(ifg_path)
-    ifg_data = np.ma.masked_values(ifg_data, 0)
 
     # Combine masks
-    data.mask = ifg_data.mask | data.mask
+    _mask_water(data, ifg_path)
 
     sar = insar.SAR(era_delays['lons'],
                     era_delays['lats'],
                     data,
                     master_date)
 
-    fig, bmap = plot_ifg(sar, center_zero=False)
+    fig, bmap = plot_ifg(sar, center_zero=False, apply_layout=not output)
 
     title_map = {'total': 'Total', 'hydro': 'Hydrostatic', 'wet': 'Wet'}
     title_str = "{kind:s} Delay\n{date:}".format(kind=title_map[kind],
@@ -649,7 +1054,7 @@ def plot_train_sar_delay(master_date, kind='total', output=None):
     axes.set_title(title_str)
 
     if output:
-        fig.savefig(output, bbox_inches='tight')
+        _savefig(fig, output)
     else:
         plt.show()
 
@@ -664,32 +1069,15 @@ def _plot_train_ifg_delay(args):
 
     master_date = args.master_date
     slave_date = args.slave_date
-    if args.hydrostatic:
-        output = args.output
-        if output:
-            comps = os.path.splitext(output)
-            output = comps[0] + '_hydro' + comps[1]
-
-        plot_train_ifg_delay(master_date, slave_date, kind='hydro',
-                             output=output)
-
-    if args.wet:
-        output = args.output
-        if output:
-            comps = os.path.splitext(output)
-            output = comps[0] + '_wet' + comps[1]
-
-        plot_train_ifg_delay(master_date, slave_date, kind='wet',
-                             output=output)
+    tasks = []
+    for (flag, kind) in ((args.hydrostatic, 'hydro'), (args.wet, 'wet'),
+                         (args.total, 'total')):
+        if flag:
+            tasks += [(master_date, slave_date, kind,
+                       _kind_output(args.output, kind))]
 
-    if args.total:
-        output = args.output
-        if output:
-            comps = os.path.splitext(output)
-            output = comps[0] + '_total' + comps[1]
+    _plot_many(plot_train_ifg_delay, tasks)
 
-        plot_train_ifg_delay(master_date, slave_date, kind='total',
-                             output=output)
 
 def plot_train_ifg_delay(master_date, slave_date, kind='total', output=None):
     """Plot the interferometric delay for a date computed from ERA by TRAIN
@@ -721,29 +1109,27 @@ def plot_train_ifg_delay(master_date, slave_date, kind='total', output=None):
                                              master_date,
                                              slave_date)
 
-    data = np.zeros(corrections['wet_delay'].shape)
     if kind == 'hydro':
-        data[:, :] = corrections['hydro_delay']
+        data = corrections['hydro_delay']
     elif kind == 'wet':
-        data[:, :] = corrections['wet_delay']
+        data = corrections['wet_delay']
     elif kind == 'total':
-        data[:, :] = corrections['total_delay']
+        data = corrections['total_delay']
     else:
         raise KeyError('"kind" was not one of hydro, wet or total')
 
-    # Mask invalid data
-    data = np.ma.masked_invalid(data)
+    # Mask invalid data, in single precision like plot_train_sar_delay
+    data = np.ma.masked_invalid(np.ascontiguousarray(data, dtype=np.float32),
+                                copy=False)
 
     # Get a mask for water from the interferogram
     ifg_path = os.path.join(config.SCRATCH_DIR,
                             'uifg_resampled',
                             (slave_date.strftime('%Y%m%d') + '_' +
                              master_date.strftime('%Y%m%d') + '.npy'))
-    ifg_data = np.load(ifg_path)
-    ifg_data = np.ma.masked_values(ifg_data, 0)
 
     # Combine masks
-    data.mask = ifg_data.mask | data.mask
+    _mask_water(data, ifg_path)
 
     ifg = insar.InSAR(corrections['lons'],
                       corrections['lats'],
@@ -751,7 +1137,7 @@ def plot_train_ifg_delay(master_date, slave_date, kind='total', output=None):
                       master_date,
                       slave_date)
 
-    fig, bmap = plot_ifg(ifg)
+    fig, bmap = plot_ifg(ifg, apply_layout=not output)
     axes = fig.get_axes()[0]
     title_map = {'wet': 'Wet', 'hydro': 'Hydrostatic', 'total': 'Total'}
     title = '{:s} Delay\nMaster: {:s}\nSlave: {:s}'.format(title_map[kind],
@@ -760,7 +1146,7 @@ def plot_train_ifg_delay(master_date, slave_date, kind='total', output=None):
     axes.set_title(title)
 
     if output:
-        fig.savefig(output, bbox_inches='tight')
+        _savefig(fig, output)
     else:
         plt.show()
 
@@ -779,17 +1165,21 @@ def _plot_sar_delay(args):
     if args.total:
         kinds += ['total']
 
+    # Name outputs after their kind when plotting several so they don't
+    # overwrite each other.
+    outputs = []
     for kind in kinds:
-        plot_sar_delay(date, kind, args.zenith, args.output)
-
+        output = args.output
+        if len(kinds) > 1:
+            output = _kind_output(output, kind)
+        outputs += [output]
 
-def plot_sar_delay(date, kind='total', zenith=False, output=None):
-    if isinstance(date, str):
-        date = datetime.strptime(date, '%Y%m%d').date()
+    plot_sar_delays(date, kinds, args.zenith, outputs)
 
-    if kind not in ('total', 'dry', 'wet', 'liquid'):
-        raise KeyError('Unknown kind {}'.format(kind))
 
+def _load_sar_delay(date, kind, zenith):
+    """Load a delay as an `insar.SAR` instance with water and invalid pixels
+    masked."""
     datestamp = date.strftime('%Y%m%d')
     delay_dir = ""
     if zenith:
@@ -798,25 +1188,23 @@ def plot_sar_delay(date, kind='total', zenith=False, output=None):
         delay_dir = os.path.join(config.SCRATCH_DIR, 'slant_delays')
 
     delay_file = os.path.join(delay_dir, datestamp + '_' + kind + '.npy')
-    delay = np.load(delay_file)
-    lons, lats = workflow.read_grid_from_file(os.path.join(config.SCRATCH_DIR,
-                                                           'grid.txt'))
+    delay = np.load(delay_file, mmap_mode='r')
+    lons, lats = _grid(os.path.join(config.SCRATCH_DIR, 'grid.txt'))
 
     # Get a mask for water from one of the interferograms
     ifg_path = os.path.join(config.SCRATCH_DIR, 'master_atmosphere',
                             config.MASTER_DATE.strftime('%Y%m%d') + '.npy')
-    ifg_data = np.load(ifg_path)
-    ifg_data = np.ma.masked_values(ifg_data, 0)
 
-    delay = np.ma.masked_invalid(delay)
+    delay = np.ma.masked_invalid(np.ascontiguousarray(delay, dtype=np.float32),
+                                 copy=False)
 
     # Combine masks
-    delay.mask = ifg_data.mask | delay.mask
+    _mask_water(delay, ifg_path)
 
-    sar = insar.SAR(lons, lats, delay, date)
+    return insar.SAR(lons, lats, delay, date)
 
-    fig, bmap = plot_ifg(sar, center_zero=False)
 
+def _sar_delay_title(date, kind, zenith):
     title_map = {'total': 'Total', 'dry': 'Hydrostatic', 'wet': 'Wet',
                  'liquid': 'Liquid'}
     title_str = "{kind:s} Delay\n{date:}".format(kind=title_map[kind],
@@ -825,17 +1213,106 @@ def plot_sar_delay(date, kind='total', zenith=False, output=None):
     if zenith:
         title_str += ' (Zenith)'
 
+    return title_str
+
+
+def _replace_grid_data(axes, data, rows=None, clim=None):
+    """Swap the data drawn by `_draw_grid` on `axes` for `data`.
+
+    `rows` are the image rows from `_image_rows` if the data was drawn as an
+    image. The colour scale is set to the (vmin, vmax) tuple `clim`, or fitted
+    to the new data if it isn't given, and the colour bar updated.
+    """
+    if axes.images:
+        artist = axes.images[0]
+        artist.set_data(data if rows is None else data[rows])
+    else:
+        artist = next(c for c in axes.collections
+                      if isinstance(c, QuadMesh))
+        values = np.ma.asarray(data)
+        if artist.get_array().size != values.size:
+            # Flat shading drops the last row and column
+            values = values[:-1, :-1]
+        artist.set_array(values.ravel())
+
+    if clim is None:
+        artist.autoscale()
+    else:
+        artist.set_clim(*clim)
+    if artist.colorbar is not None:
+        artist.colorbar.update_normal(artist)
+
+
+def plot_sar_delay(date, kind='total', zenith=False, output=None):
+    if isinstance(date, str):
+        date = datetime.strptime(date, '%Y%m%d').date()
+
+    if kind not in ('total', 'dry', 'wet', 'liquid'):
+        raise KeyError('Unknown kind {}'.format(kind))
+
+    sar = _load_sar_delay(date, kind, zenith)
+
+    fig, bmap = plot_ifg(sar, center_zero=False, apply_layout=not output)
+
     axes = fig.get_axes()[0]
-    axes.set_title(title_str)
+    axes.set_title(_sar_delay_title(date, kind, zenith))
 
     if output:
-        fig.savefig(output, bbox_inches='tight')
+        _savefig(fig, output)
     else:
         plt.show()
 
     plt.close()
 
 
+def plot_sar_delays(date, kinds, zenith=False, outputs=None):
+    """Plot several kinds of delay for one date.
+
+    When saving, the figure is set up once and only the data and title change
+    between kinds, so the coastlines, grid lines and colour bar are not redrawn
+    from scratch for each one. Without `outputs` each kind is shown in turn.
+
+    Arguments
+    ---------
+    date : str or date
+      If a string, should be in the format '%Y%m%d'.
+    kinds : list(str)
+      The kinds of delay to plot. See `plot_sar_delay`.
+    zenith : bool, opt
+      Plot zenith delays instead of slant delays.
+    outputs : list(str), opt
+      The path to save each kind to.
+    """
+    if isinstance(date, str):
+        date = datetime.strptime(date, '%Y%m%d').date()
+
+    for kind in kinds:
+        if kind not in ('total', 'dry', 'wet', 'liquid'):
+            raise KeyError('Unknown kind {}'.format(kind))
+
+    if not outputs or not all(outputs):
+        for kind in kinds:
+            plot_sar_delay(date, kind, zenith)
+        return
+
+    fig = None
+    for kind, output in zip(kinds, outputs):
+        sar = _load_sar_delay(date, kind, zenith)
+        if fig is None:
+            fig, bmap = plot_ifg(sar, center_zero=False, apply_layout=False)
+            axes = fig.get_axes()[0]
+            rows = None
+            if _image_grid(bmap, sar.lons, sar.lats):
+                rows, _ = _image_rows(bmap, sar.lons, sar.lats)
+        else:
+            _replace_grid_data(axes, sar.data, rows=rows)
+
+        axes.set_title(_sar_delay_title(date, kind, zenith))
+        _savefig(fig, output, fast_png=True)
+
+    plt.close(fig)
+
+
 def _plot_insar_delay(args):
     plot_insar_delay(args.master_date, args.slave_date, args.output)
 
@@ -851,27 +1328,25 @@ def plot_insar_delay(master_date, slave_date, output=None):
                    + master_date.strftime('%Y%m%d') + '.npy')
     delay_fpath = os.path.join(delay_dir, delay_fname)
 
-    delay = np.load(delay_fpath)
+    delay = np.load(delay_fpath, mmap_mode='r')
 
-    lons, lats = workflow.read_grid_from_file(os.path.join(config.SCRATCH_DIR,
-                                                           'grid.txt'))
+    lons, lats = _grid(os.path.join(config.SCRATCH_DIR, 'grid.txt'))
 
     # Get a mask for water from one of the interferograms
     ifg_path = os.path.join(config.SCRATCH_DIR,
                             'uifg_resampled',
                             (slave_date.strftime('%Y%m%d') + '_'
                              + master_date.strftime('%Y%m%d') + '.npy'))
-    ifg_data = np.load(ifg_path)
-    ifg_data = np.ma.masked_values(ifg_data, 0)
 
-    delay = np.ma.masked_invalid(delay)
+    delay = np.ma.masked_invalid(np.ascontiguousarray(delay, dtype=np.float32),
+                                 copy=False)
 
     # Combine masks
-    delay.mask = ifg_data.mask | delay.mask
+    _mask_water(delay, ifg_path)
 
     ifg = insar.InSAR(lons, lats, delay, master_date, slave_date)
 
-    fig, bmap = plot_ifg(ifg)
+    fig, bmap = plot_ifg(ifg, apply_layout=not output)
 
     title_str = ("Total Delay\nMaster Date: {}\nSlave Date: {}"
                  .format(master_date.strftime('%Y-%m-%d'),
@@ -880,7 +1355,7 @@ def plot_insar_delay(master_date, slave_date, output=None):
     axes.set_title(title_str)
 
     if output:
-        fig.savefig(output, bbox_inches='tight')
+        _savefig(fig, output)
     else:
         plt.show()
 
@@ -888,37 +1363,159 @@ def plot_insar_delay(master_date, slave_date, output=None):
 
 
 def _plot_lwc(args):
-    date = datetime.strptime(args.date, '%Y%m%d').date()
+    if args.date:
+        date = datetime.strptime(args.date, '%Y%m%d').date()
+        plot_lwc(date, args.output)
+        return
+
+    start, end = args.dates
+    dates = [date for date in _lwc_dates() if start <= date <= end]
+    outputs = [_kind_output(args.output, date.strftime('%Y%m%d'))
+               for date in dates]
+
+    _plot_lwc_pool(dates, outputs)
+
+
+def _date_range(value):
+    """Parse a START:END (YYYYMMDD:YYYYMMDD) argument into a pair of dates."""
+    try:
+        start, end = [datetime.strptime(d, '%Y%m%d').date()
+                      for d in value.split(':')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'expected START:END as YYYYMMDD:YYYYMMDD, got {!r}'.format(value))
+
+    if start > end:
+        raise argparse.ArgumentTypeError(
+            'start date {} is after end date {}'.format(start, end))
+
+    return start, end
+
+
+_LWC_NAME_RE = re.compile(r'^\d{8}\.npy$')
+
+
+def _lwc_dates():
+    """Sorted list of the dates with a liquid water content estimate.
+
+    Files in the lwc directory that are not named YYYYMMDD.npy are ignored.
+    """
+    lwc_dir = os.path.join(config.SCRATCH_DIR, 'lwc')
 
-    plot_lwc(date, args.output)
+    dates = []
+    for name in os.listdir(lwc_dir):
+        if not _LWC_NAME_RE.match(name):
+            continue
+        try:
+            dates.append(datetime.strptime(name, '%Y%m%d.npy').date())
+        except ValueError:
+            logging.debug('Skipping %s, not a valid date', name)
+
+    return sorted(dates)
+
+
+def _plot_lwc_pool(dates, fnames):
+    """Plot the liquid water content for many dates in parallel.
+
+    The dates are shared out between one process per CPU and each process
+    plots its share on one figure with `plot_lwc_many`.
+    """
+    nprocesses = min(len(dates), os.cpu_count() or 1)
+    if nprocesses <= 1:
+        plot_lwc_many(dates, fnames)
+        return
+
+    # Build the Basemap before forking so the workers start with it cached
+    lons, lats = _grid(os.path.join(config.SCRATCH_DIR, 'grid.txt'))
+    _get_basemap(float(lons[0]), float(lats[0]),
+                 float(lons[-1]), float(lats[-1]),
+                 _coast_detail(lons, lats))
+
+    tasks = [(dates[i::nprocesses], fnames[i::nprocesses])
+             for i in range(nprocesses)]
+    with Pool(nprocesses, initializer=_init_plot_worker) as p:
+        p.starmap(plot_lwc_many, tasks, chunksize=1)
 
 
 def plot_lwc(date, fname=None):
+    data, vmax = _load_lwc(date)
+    fig = _lwc_figure(data, vmax)[0]
+
+    if fname:
+        _savefig(fig, fname)
+    else:
+        fig.tight_layout()
+        plt.show()
+
+
+def plot_lwc_many(dates, fnames):
+    """Plot the liquid water content for several dates.
+
+    The map is set up once and only the data and colour scale change between
+    dates, so the coastlines, grid lines and colour bar are not redrawn from
+    scratch for each one.
+
+    Arguments
+    ---------
+    dates : list(date)
+      The dates to plot.
+    fnames : list(str)
+      The path to save the plot for each date to.
+    """
+    fig = None
+    for date, fname in zip(dates, fnames):
+        data, vmax = _load_lwc(date)
+        if fig is None:
+            fig, axes, cbar, rows = _lwc_figure(data, vmax)
+        elif axes.images:
+            # Pre-coloured image from _lwc_figure
+            if rows is not None:
+                data = data[rows]
+            axes.images[0].set_data(_lwc_rgba(data, vmax))
+            cbar.mappable.set_clim(0, vmax)
+            cbar.update_normal(cbar.mappable)
+        else:
+            _replace_grid_data(axes, data, clim=(0, vmax))
+
+        _savefig(fig, fname, fast_png=True)
+
+    if fig is not None:
+        plt.close(fig)
+
+
+def _load_lwc(date):
+    """Memory map the liquid water content for `date`, returning it and its
+    maximum."""
     lwc_file = os.path.join(config.SCRATCH_DIR, 'lwc',
                             date.strftime('%Y%m%d') + '.npy')
-    data = np.load(lwc_file)
-    print(data.max())
+    data = np.load(lwc_file, mmap_mode='r')
+    vmax = float(data.max())
+    logging.debug('Maximum liquid water content for %s is %f', date, vmax)
+
+    return data, vmax
+
 
+def _lwc_figure(data, vmax):
+    """Draw a liquid water content map of `data` on a new figure.
+
+    Returns the figure, its axes, the colour bar and, if the data was drawn as
+    a pre-coloured image, the image rows from `_image_rows`.
+    """
     grid_file = os.path.join(config.SCRATCH_DIR, 'grid.txt')
-    lons, lats = workflow.read_grid_from_file(grid_file)
+    lons, lats = _grid(grid_file)
 
     fig = plt.figure(dpi=DPI, figsize=FIGSIZE)
     axes = fig.add_subplot(1, 1, 1)
 
-    bmap = Basemap(llcrnrlon=lons[0],
-                   llcrnrlat=lats[0],
-                   urcrnrlon=lons[-1],
-                   urcrnrlat=lats[-1],
-                   resolution=COAST_DETAIL,
-                   projection='merc',
-                   ax=axes)
+    bmap = _get_basemap(float(lons[0]), float(lats[0]),
+                        float(lons[-1]), float(lats[-1]),
+                        _coast_detail(lons, lats))
+    bmap.ax = axes
 
     if FIGSIZE is not None and FIGSIZE[0] <= 2:
-        parallels = np.linspace(lats[0], lats[-1], 2)
-        meridians = np.linspace(lons[0], lons[-1], 2)
+        parallels, meridians = _gridlines(lons, lats, 2)
     else:
-        parallels = np.linspace(lats[0], lats[-1], 5)
-        meridians = np.linspace(lons[0], lons[-1], 5)
+        parallels, meridians = _gridlines(lons, lats)
 
     bmap.drawcoastlines()
     bmap.drawparallels(parallels, labels=[True, False, False, False],
@@ -927,41 +1524,47 @@ def plot_lwc(date, fname=None):
                        fmt="%.2f", fontsize=plt.rcParams['xtick.labelsize'])
     bmap.drawmapboundary()
 
-    lon_mesh, lat_mesh = np.meshgrid(lons, lats)
-    image = bmap.pcolormesh(lon_mesh,
-                            lat_mesh,
-                            data,
-                            latlon=True,
-                            cmap=cm.Blues,
-                            vmin=0,
-                            vmax=data.max())
+    rows = None
+    if _image_grid(bmap, lons, lats):
+        # Colour the data up front so drawing only has to copy pixels, and
+        # give the colour bar its own mappable for the scale.
+        _draw_grid(bmap, lons, lats, _lwc_rgba(data, vmax))
+        rows, _ = _image_rows(bmap, lons, lats)
+        mappable = cm.ScalarMappable(norm=Normalize(0, vmax), cmap=cm.Blues)
+        mappable.set_array([])
+    else:
+        mappable = _draw_grid(bmap, lons, lats, data, cmap=cm.Blues, vmin=0,
+                              vmax=vmax)
 
-    cbar = fig.colorbar(image, pad=0.07, ax=axes)
+    cbar = fig.colorbar(mappable, pad=0.07, ax=axes)
     cbar.set_label(r'Liquid Water Content / g m$^{-3}$')
 
-    fig.tight_layout()
-    if fname:
-        fig.savefig(fname, bbox_inches='tight')
-    else:
-        plt.show()
+    return fig, axes, cbar, rows
 
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(prog='pysarts.plot')
-    parser.add_argument('-d', '--directory', action='store', default='.',
-                        help=('The project directory'))
-    parser.add_argument('-r', '--coast-detail', action='store',
-                        default='i',
-                        help='Resolution of coastlines in the plot')
-    parser.add_argument('-f', '--figsize', action='store', nargs=2, type=float,
-                        default=None,
-                        help='The width and height of the figure in inches')
-    parser.add_argument('--dpi', action='store', type=int, default=None,
-                        help='The dpi of the figure')
+def _lwc_rgba(data, vmax):
+    """Colour `data` with `cm.Blues` scaled from 0 to `vmax`, returning a uint8
+    RGBA image.
 
-    subparsers = parser.add_subparsers()
+    This gives the same colours as drawing `data` with the colour map, but
+    looks them up once instead of normalising the floats on every draw.
+    Invalid values are transparent.
+    """
+    cmap = cm.Blues
+    lut = cmap(np.arange(cmap.N), bytes=True)
 
-    # Plot unwrapped interferogram parser
+    invalid = ~np.isfinite(data)
+    indices = np.multiply(data, cmap.N / vmax if vmax > 0 else 0)
+    indices[invalid] = 0
+    np.clip(indices, 0, cmap.N - 1, out=indices)
+
+    rgba = lut[indices.astype(np.uint8)]
+    rgba[invalid] = 0
+
+    return rgba
+
+
+def _register_uifg(subparsers):
     plot_uifg_subparser = subparsers.add_parser('uifg',
                                                 help='Plot an unwrapped interferogram')
     plot_uifg_subparser.set_defaults(func=_parse_unwrapped_ifg_args)
@@ -978,6 +1581,8 @@ if __name__ == '__main__':
     plot_uifg_subparser.add_argument('-c', '--corrected', action='store_true',
                                      help='Plot corrected interferogram')
 
+
+def _register_master_atmos(subparsers):
     plot_master_atmosphere_subparser = subparsers.add_parser('master-atmos',
                                                              help='Plot master atmosphere for a date')
     plot_master_atmosphere_subparser.set_defaults(func=_plot_master_atmosphere)
@@ -985,6 +1590,8 @@ if __name__ == '__main__':
     plot_master_atmosphere_subparser.add_argument('-o', '--output', action='store', default=None,
                                                   help='Output file name')
 
+
+def _register_dem_error(subparsers):
     plot_dem_error_subparser = subparsers.add_parser('dem-error',
                                                      help='Plot DEM error constant for a date')
     plot_dem_error_subparser.set_defaults(func=_plot_dem_error)
@@ -992,6 +1599,8 @@ if __name__ == '__main__':
     plot_dem_error_subparser.add_argument('-o', '--output', action='store', default=None,
                                           help='Output file name')
 
+
+def _register_rain_scatter(subparsers):
     rain_scatter_parser = subparsers.add_parser('rain-scatter',
                                                 help=('Plot a rainfall vs. LOS '
                                                       'delay scatter chart'))
@@ -1002,6 +1611,8 @@ if __name__ == '__main__':
     rain_scatter_parser.add_argument('-o', '--output', action='store',
                                      default=None, help='Output file name')
 
+
+def _register_weather(subparsers):
     plot_radar_rainfall_subparser = subparsers.add_parser('weather',
                                                           help='Plot a rainfall radar image')
     plot_radar_rainfall_subparser.set_defaults(func=_plot_weather)
@@ -1016,6 +1627,8 @@ if __name__ == '__main__':
                                                action='store_true',
                                                help='Plot the entire radar image instead of just the project region')
 
+
+def _register_profile(subparsers):
     plot_profile_subparser = subparsers.add_parser('profile',
                                                    help='Plot master atmosphere LOS delay and rainfall along a profile')
     plot_profile_subparser.set_defaults(func=_plot_profile)
@@ -1042,6 +1655,8 @@ if __name__ == '__main__':
                                         default=None,
                                         help='Output file name')
 
+
+def _register_baseline(subparsers):
     baseline_plot_subparser = subparsers.add_parser('baseline',
                                                     help='Make a baseline plot')
     baseline_plot_subparser.set_defaults(func=_plot_baseline_plot)
@@ -1054,6 +1669,8 @@ if __name__ == '__main__':
                                          default=None,
                                          help='Master date of baseline plot')
 
+
+def _register_era_slant_delay(subparsers):
     train_sar_delay_parser = subparsers.add_parser('era-slant-delay',
                                                    help='Plot slant delay for a single date calculated by ERA')
     train_sar_delay_parser.add_argument('-d', '--date',
@@ -1075,6 +1692,8 @@ if __name__ == '__main__':
                                         help='Output file name')
     train_sar_delay_parser.set_defaults(func=_plot_train_sar_delay)
 
+
+def _register_train_insar_delay(subparsers):
     train_insar_delay_parser = subparsers.add_parser('train-insar-delay',
                                                      help=('Plot interferometric atmospheric'
                                                            'delays calculated by TRAIN from ERA'))
@@ -1103,6 +1722,8 @@ if __name__ == '__main__':
                                           help='Output file name')
     train_insar_delay_parser.set_defaults(func=_plot_train_ifg_delay)
 
+
+def _register_sar_delay(subparsers):
     sar_delay_parser = subparsers.add_parser('sar-delay',
                                              help=('Plot SAR delays computed by pysarts'))
     sar_delay_parser.add_argument('-d', '--date',
@@ -1130,6 +1751,8 @@ if __name__ == '__main__':
                                   help='Output file name')
     sar_delay_parser.set_defaults(func=_plot_sar_delay)
 
+
+def _register_insar_delay(subparsers):
     insar_delay_parser = subparsers.add_parser('insar-delay',
                                                help=('Plot InSAR delay '
                                                      'computed by pysarts'))
@@ -1149,25 +1772,97 @@ if __name__ == '__main__':
                                     help='Output file name')
     insar_delay_parser.set_defaults(func=_plot_insar_delay)
 
+
+def _register_lwc(subparsers):
     lwc_parser = subparsers.add_parser('lwc',
                                        help=('Plot estimated liquid water content'))
-    lwc_parser.add_argument('-d', '--date',
-                            action='store',
-                            required=True)
+    lwc_dates_group = lwc_parser.add_mutually_exclusive_group(required=True)
+    lwc_dates_group.add_argument('-d', '--date',
+                                 action='store',
+                                 help='Date to plot (YYYYMMDD)')
+    lwc_dates_group.add_argument('--dates',
+                                 action='store',
+                                 type=_date_range,
+                                 help=('Plot every date from START to END '
+                                       'inclusive in parallel, given as '
+                                       'START:END (YYYYMMDD:YYYYMMDD). Each '
+                                       'output file is named after its date'))
     lwc_parser.add_argument('-o', '--output',
                             default=None,
                             action='store',
                             help=('Output file name'))
     lwc_parser.set_defaults(func=_plot_lwc)
 
-    args = parser.parse_args()
-    os.chdir(args.directory)
 
-    COAST_DETAIL = args.coast_detail
+# Functions adding the parser for each subcommand
+_SUBCOMMANDS = {
+    'uifg': _register_uifg,
+    'master-atmos': _register_master_atmos,
+    'dem-error': _register_dem_error,
+    'rain-scatter': _register_rain_scatter,
+    'weather': _register_weather,
+    'profile': _register_profile,
+    'baseline': _register_baseline,
+    'era-slant-delay': _register_era_slant_delay,
+    'train-insar-delay': _register_train_insar_delay,
+    'sar-delay': _register_sar_delay,
+    'insar-delay': _register_insar_delay,
+    'lwc': _register_lwc,
+}
+
+
+def _add_subcommands(subparsers, argv):
+    """Add the subcommand parsers needed to parse `argv`.
+
+    Only the subcommands named in `argv` are added, unless help is requested
+    or none are named, in which case they all are.
+    """
+    requested = [name for name in _SUBCOMMANDS if name in argv]
+    if not requested or '-h' in argv or '--help' in argv:
+        requested = list(_SUBCOMMANDS)
+
+    for name in requested:
+        _SUBCOMMANDS[name](subparsers)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='pysarts.plot')
+    parser.add_argument('-d', '--directory', action='store', default='.',
+                        help=('The project directory'))
+    parser.add_argument('-r', '--coast-detail', action='store',
+                        default='i',
+                        help=('Resolution of coastlines in the plot. One of '
+                              'c, l, i, h, f or auto to choose from the '
+                              'extent of the plot'))
+    parser.add_argument('-f', '--figsize', action='store', nargs=2, type=float,
+                        default=None,
+                        help='The width and height of the figure in inches')
+    parser.add_argument('--dpi', action='store', type=int, default=None,
+                        help='The dpi of the figure')
+
+    subparsers = parser.add_subparsers()
+    _add_subcommands(subparsers, sys.argv[1:])
+
+    args = parser.parse_args()
+    if not hasattr(args, 'func'):
+        parser.error('a plot subcommand is required')
+    if getattr(args, 'dates', None) and not args.output:
+        parser.error('--dates requires -o/--output to name the files for each '
+                     'date')
+
+    # Only touch the project once the command line is known to be usable
+    try:
+        os.chdir(args.directory)
+        config.load_from_yaml('config.yml')
+    except FileNotFoundError as e:
+        parser.error('could not load the project in {}: {}'
+                     .format(args.directory, e))
+
+    COAST_DETAIL = (None if args.coast_detail == 'auto'
+                    else args.coast_detail)
     FIGSIZE = args.figsize
     DPI = args.dpi
 
-    config.load_from_yaml('config.yml')
     logging.basicConfig(level=config.LOG_LEVEL)
 
     args.func(args)
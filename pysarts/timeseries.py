@@ -7,7 +7,7 @@ def calculate_dem_master_atmosphere(ts_ifgs, baselines, dates, master_date):
     Arguments
     ---------
     ts_ifgs : ndarray
-      A 3D matrix of interferograms that form a timeseries along the third
+      A 3D matrix of interferograms that form a timeseries along the first
       dimension of the matrix.
     baselines : array_like
       An array of perpendicular baselines for each ifg date relative to the
@@ -25,16 +25,16 @@ def calculate_dem_master_atmosphere(ts_ifgs, baselines, dates, master_date):
     """
     # Make dates relative to the master_date
     relative_dates = [(date - master_date).days for date in dates]
-    grid_shape = ts_ifgs.shape[0:2]
+    grid_shape = ts_ifgs.shape[1:3]
     master_atmosphere = np.zeros(grid_shape)
     dem_error = np.zeros(grid_shape)
 
-    kernel = np.ones((ts_ifgs.shape[2], 3))
+    kernel = np.ones((ts_ifgs.shape[0], 3))
     kernel[:, 1] = np.array(baselines)
     kernel[:, 2] = np.array(relative_dates)
 
     # Reshape matrices so the inversion can be run in one function call
-    data = ts_ifgs.transpose(2, 0, 1).reshape(kernel.shape[0], -1)
+    data = ts_ifgs.reshape(kernel.shape[0], -1)
     logging.info('Solving for %d unknowns using %d knowns',
                  3 * grid_shape[0] * grid_shape[1],
                  data.size)
@@ -1,3 +1,4 @@
+from functools import lru_cache
 import os.path
 from datetime import datetime
 
@@ -6,6 +7,7 @@ from numba import jit
 import numba
 import numpy as np
 
+
 def extract_timestamp_from_ifg_name(file_name):
     """Extract master and slave date objects from the name of an interferogram.
 
@@ -21,7 +23,11 @@ def extract_timestamp_from_ifg_name(file_name):
     -------
     A 2-tuple containing (master, slave) date objects.
     """
-    base_name = os.path.basename(file_name)
+    return _extract_timestamp_from_basename(os.path.basename(file_name))
+
+
+@lru_cache(maxsize=4096)
+def _extract_timestamp_from_basename(base_name):
     base_name, _ = os.path.splitext(base_name)
     name_parts = base_name.split('_')
     slave_date = datetime.strptime(name_parts[0], "%Y%m%d")
@@ -45,7 +51,7 @@ def load_dem(path):
 
 
 # Taken from David-OConnor/brisk.
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def bisect(a, x):
     """Similar to bisect.bisect() from the built-in library."""
     M = a.size
@@ -56,7 +62,7 @@ def bisect(a, x):
     return M
 
 
-@jit(numba.float64[:](numba.float64[:], numba.float64[:], numba.float64[:]))
+@jit(numba.float64[:](numba.float64[:], numba.float64[:], numba.float64[:]), cache=True)
 def interp1d(xs, ys, xis):
     """1D linear interpolation of points with linear extrapolation.
 
@@ -86,7 +92,7 @@ def interp1d(xs, ys, xis):
     return yis
 
 
-@jit(numba.void(numba.float64[:], numba.float64[:], numba.float64[:], numba.float64[:]), nopython=True)
+@jit(numba.void(numba.float64[:], numba.float64[:], numba.float64[:], numba.float64[:]), nopython=True, cache=True)
 def interp1d_jit(xs, ys, xis, yis):
     for idx in range(xis.size):
         idx1 = bisect(xs, xis[idx])
@@ -104,15 +110,42 @@ def interp1d_jit(xs, ys, xis, yis):
                                / (xs[idx1] - xs[idx0]))
 
 
-# Implementation based on Numpy implementation
-@jit(nopython=True)
-def trapz(xs, ys):
-    """Integration of points using trapezium rule.
+@jit(numba.void(numba.float64[:], numba.float64[:], numba.float64[:], numba.float64[:]), nopython=True, cache=True)
+def interp1d_sorted_jit(xs, ys, xis, yis):
+    """As `interp1d_jit` but for points `xis` in ascending order.
+
+    Rather than bisecting `xs` for every point, the search resumes from the
+    interval the previous point fell in so all of `xis` is interpolated in a
+    single pass over `xs`.
+    """
+    upper = 0
+    for idx in range(xis.size):
+        while upper < xs.size and xs[upper] <= xis[idx]:
+            upper += 1
+
+        # Extrapolate if interpolation point falls outside of xs.
+        if upper == 0:
+            idx0, idx1 = 0, 1
+        elif upper == xs.size:
+            idx0, idx1 = xs.size - 2, xs.size - 1
+        else:
+            idx0, idx1 = upper - 1, upper
+
+        yis[idx] = ys[idx0] + ((xis[idx] - xs[idx0]) * (ys[idx1] - ys[idx0])
+                               / (xs[idx1] - xs[idx0]))
+
+
+@jit(nopython=True, cache=True)
+def simps(xs, ys):
+    """Integration of evenly spaced points using Simpson's rule.
+
+    If there is an odd number of intervals the last one is integrated using the
+    trapezium rule.
 
     Arguments
     ---------
     xs : (n,) ndarray
-      Points where function to integrate has been evaluated at.
+      Evenly spaced points where function to integrate has been evaluated at.
     ys : (n,) ndarray
       Value of function to integrate at points `xs`.
 
@@ -120,5 +153,21 @@ def trapz(xs, ys):
     -------
     A float.
     """
-    d = np.diff(xs)
-    return (d * (ys[1:] + ys[:-1]) / 2.0).sum()
+    n = xs.size
+    if n < 2:
+        return 0.0
+
+    h = (xs[-1] - xs[0]) / (n - 1)
+    nsimps = n if n % 2 == 1 else n - 1
+
+    total = 0.0
+    if nsimps >= 3:
+        total = ys[0] + ys[nsimps - 1]
+        for idx in range(1, nsimps - 1):
+            total += (4.0 if idx % 2 == 1 else 2.0) * ys[idx]
+        total *= h / 3.0
+
+    if nsimps != n:
+        total += h * (ys[-2] + ys[-1]) / 2.0
+
+    return total
@@ -2,6 +2,8 @@
 
 Almost all of these functions have side-effects.
 """
+import itertools
+from functools import lru_cache
 import logging
 import os
 import shutil
@@ -25,10 +27,18 @@ from . import insar
 from . import timeseries
 from . import util
 
-def load_config(path):
+def load_config(path, conf=None, base_dir=None):
     """Loads the configuration from the YAML file at `path`, updating the config and
-    logging modules."""
-    config.load_from_yaml(path)
+    logging modules.
+
+    If `conf` is given it is used as the already parsed contents of `path`.
+    Relative paths in the configuration are resolved against `base_dir` if it
+    is given.
+    """
+    if conf is None:
+        config.load_from_yaml(path, base_dir)
+    else:
+        config.load_from_dict(conf, base_dir)
     logging.basicConfig(level=config.LOG_LEVEL)
 
 def find_ifgs():
@@ -142,6 +152,61 @@ def read_grid_from_file(path):
     return (lons, lats)
 
 
+def load_uifg_ts(master_date, grid_shape):
+    """Load the inverted time series saved for `master_date` by the invert step.
+
+    Arguments
+    ---------
+    master_date : str
+      The master date of the time series as YYYYMMDD.
+    grid_shape : tuple
+      The (lat, lon) shape of the grid in 'grid.txt'.
+
+    Returns
+    -------
+    A 2-tuple containing (ts_ifgs, dates). `ts_ifgs` is a read-only memory
+    map with `dates` along the first axis.
+
+    Raises a ValueError if the time series doesn't have that shape. Time
+    series saved with dates along the last axis need the invert step re-run.
+    """
+    base_path = os.path.join(config.SCRATCH_DIR, 'uifg_ts', master_date)
+    ts_ifgs = np.load(base_path + '.npy', mmap_mode='r')
+    with open(base_path + '.yml') as f:
+        dates = yaml.safe_load(f)
+
+    expected_shape = (len(dates),) + tuple(grid_shape)
+    if ts_ifgs.shape != expected_shape:
+        raise ValueError(('Time series {}.npy has shape {} but {} was '
+                          'expected with the dates along the first axis. '
+                          'Re-run the inversion step for this master '
+                          'date.').format(base_path, ts_ifgs.shape,
+                                          expected_shape))
+
+    return ts_ifgs, dates
+
+
+@lru_cache(maxsize=8)
+def _list_dated_netcdf_files(target_dir):
+    """Find the NetCDF files named by date and time (YYYYmmddHHMM) under
+    `target_dir`.
+
+    The directory tree is only searched once per run since these are input
+    directories that don't change while pysarts is running.
+
+    Returns a tuple of paths and a tuple of their dates.
+    """
+    paths = glob.glob(os.path.join(target_dir, '**/*.nc'),
+                      recursive=True)
+
+    dates = []
+    for path in paths:
+        filename = os.path.basename(path)
+        dates += [datetime.strptime(filename, '%Y%m%d%H%M.nc')]
+
+    return (tuple(paths), tuple(dates))
+
+
 def find_closest_weather_radar_files(master_date, target_dir=None):
     """Searches the weather radar directory for the closest weather radar images
     before and after a date and time.
@@ -167,13 +232,7 @@ def find_closest_weather_radar_files(master_date, target_dir=None):
     if target_dir is None:
         target_dir = config.WEATHER_RADAR_DIR
 
-    paths = glob.glob(os.path.join(target_dir, '**/*.nc'),
-                      recursive=True)
-
-    dates = []
-    for path in paths:
-        filename = os.path.basename(path)
-        dates += [datetime.strptime(filename, '%Y%m%d%H%M.nc')]
+    paths, dates = _list_dated_netcdf_files(target_dir)
 
     time_deltas = [master_date - date for date in dates]
     shortest_delta_before = [d for d in sorted(time_deltas) if d.total_seconds() >= 0]
@@ -219,7 +278,7 @@ def execute_invert_unwrapped_phase(args):
     This steps takes the interferograms and inverts the timeseries relative to
     the master date. The time series is saved to the `uifg_ts` directory as a 3D
     npy array called MASTER_DATE.npy. Also saved is a metadata file containing
-    the dates of each index along the third dimension of the array. A second
+    the dates of each index along the first dimension of the array. A second
     file containing the perpendicular baselines for each inverted interferogram
     is also generated.
 
@@ -242,11 +301,11 @@ def execute_invert_unwrapped_phase(args):
 
     # Work out the shape of the output data.
     ifg_date_pairs = map(util.extract_timestamp_from_ifg_name, ifg_paths)
-    nslcs = len(set([date for pair in ifg_date_pairs for date in pair]))
+    nslcs = len(set(itertools.chain.from_iterable(ifg_date_pairs)))
     logging.debug('Creating inversion output memory map')
     output_matrix = np.lib.format.open_memmap(output_file_name,
                                               'w+',
-                                              shape=(grid_shape + (nslcs,)))
+                                              shape=((nslcs,) + grid_shape))
     logging.info('Starting inversion for master date %s', config.MASTER_DATE.strftime('%Y-%m-%d'))
     dates = inversion.calculate_inverse(ifg_paths, config.MASTER_DATE.date(), grid_shape, output_matrix)
     with open(output_file_meta, 'w') as f:
@@ -284,15 +343,9 @@ def execute_calculate_dem_matmosphere_error(args):
                                           config.MASTER_DATE.strftime('%Y%m%d') + '.npy')
 
     # Load required data
-    ts_ifgs = np.load(os.path.join(config.SCRATCH_DIR,
-                                   'uifg_ts',
-                                   config.MASTER_DATE.strftime('%Y%m%d') + '.npy'),
-                      mmap_mode='r')
-    ts_dates = []
-    with open(os.path.join(config.SCRATCH_DIR,
-                           'uifg_ts',
-                           config.MASTER_DATE.strftime('%Y%m%d') + '.yml')) as f:
-        ts_dates = yaml.safe_load(f)
+    lons, lats = read_grid_from_file(os.path.join(config.SCRATCH_DIR, 'grid.txt'))
+    ts_ifgs, ts_dates = load_uifg_ts(config.MASTER_DATE.strftime('%Y%m%d'),
+                                     (len(lats), len(lons)))
 
     ts_baselines = np.loadtxt(os.path.join(config.SCRATCH_DIR,
                                            'uifg_ts',
@@ -811,6 +864,13 @@ def execute_rainfall_optimisation_step(args):
     dem.clip(lon_bounds, lat_bounds)
     dem.interp(lons, lats, method='bivariate')
 
+    if len(dates) == 1:
+        # Spread the patches over the processes instead of the dates.
+        master_date, slave_date = dates[0]
+        _rainfall_optim_heper(dem, master_date, slave_date, min_plevel,
+                              patch_size, args.ncpu)
+        return
+
     pool_args = []
     for (master_date, slave_date) in dates:
         pool_args += [(dem, master_date, slave_date, min_plevel, patch_size)]
@@ -820,7 +880,7 @@ def execute_rainfall_optimisation_step(args):
 
 
 def _rainfall_optim_heper(dem, master_date, slave_date, min_plevel,
-                          patch_size):
+                          patch_size, nprocesses=1):
     logging.info('Processing %s / %s', master_date, slave_date)
     master_datestamp = master_date.strftime('%Y%m%d')
     slave_datestamp = slave_date.strftime('%Y%m%d')
@@ -875,7 +935,7 @@ def _rainfall_optim_heper(dem, master_date, slave_date, min_plevel,
 
     output = corrections.patches_era_delay(dem, ifg, mmodel, smodel, mwr, swr,
                                            min_plevel, patch_size,
-                                           np.deg2rad(21))
+                                           np.deg2rad(21), nprocesses)
     mwet, mdry, swet, sdry, m_plevels, s_plevels = output
     master_zenith_base = os.path.join(config.SCRATCH_DIR, 'zenith_delays',
                                       master_datestamp + '_type.npy')
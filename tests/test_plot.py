@@ -0,0 +1,180 @@
+"""Tests for drawing gridded data on maps and reading interferograms in
+`pysarts.plot`."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import netCDF4
+import numpy as np
+
+from pysarts import insar, plot
+
+EARTH_RADIUS = 6370997.0
+
+
+class CylMap:
+    """Minimal stand-in for a Basemap using an equirectangular projection."""
+    projection = 'cyl'
+
+    def __init__(self):
+        self.drawn = None
+
+    def __call__(self, lon, lat):
+        return (np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+
+    def imshow(self, data, **kwargs):
+        self.drawn = (np.asarray(data), kwargs)
+
+
+class MercMap(CylMap):
+    """Minimal stand-in for a Basemap using a Mercator projection."""
+    projection = 'merc'
+
+    def __call__(self, lon, lat):
+        lon = np.radians(np.asarray(lon, dtype=float))
+        lat = np.radians(np.asarray(lat, dtype=float))
+        return (EARTH_RADIUS * lon,
+                EARTH_RADIUS * np.log(np.tan(np.pi / 4 + lat / 2)))
+
+    @staticmethod
+    def latitude(y):
+        return np.degrees(2 * np.arctan(np.exp(y / EARTH_RADIUS)) - np.pi / 2)
+
+
+class TestDrawGrid(unittest.TestCase):
+    def draw_row_indices(self, bmap, lons, lats):
+        """Draw a grid whose values are their row index, returning the image
+        and the keyword arguments it was drawn with."""
+        data = np.repeat(np.arange(lats.size, dtype=float)[:, np.newaxis],
+                         lons.size, axis=1)
+        plot._draw_grid(bmap, lons, lats, data)
+
+        return bmap.drawn
+
+    def assert_rows_placed(self, bmap, lons, lats):
+        image, kwargs = self.draw_row_indices(bmap, lons, lats)
+        self.assertEqual(kwargs['origin'], 'lower')
+        _, _, y0, y1 = kwargs['extent']
+
+        # Every image row must show the grid row covering its centre
+        nrows = image.shape[0]
+        centres = y0 + (y1 - y0) * (np.arange(nrows) + 0.5) / nrows
+        centre_lats = MercMap.latitude(centres)
+        if bmap.projection == 'cyl':
+            centre_lats = centres
+        shown_lats = lats[image[:, 0].astype(int)]
+        half_cell = abs(lats[1] - lats[0]) / 2
+        self.assertLessEqual(np.max(np.abs(shown_lats - centre_lats)),
+                             half_cell * (1 + 1e-6))
+
+    def test_merc_rows(self):
+        lons = np.linspace(-5, 0, 50)
+        self.assert_rows_placed(MercMap(), lons, np.linspace(49, 59, 1000))
+        self.assert_rows_placed(MercMap(), lons, np.linspace(50, 55, 500))
+
+    def test_merc_descending_rows(self):
+        lons = np.linspace(-5, 0, 50)
+        self.assert_rows_placed(MercMap(), lons, np.linspace(59, 49, 1000))
+
+    def test_merc_extent_covers_cells(self):
+        lons = np.linspace(-5, 0, 51)
+        lats = np.linspace(49, 59, 101)
+        _, kwargs = self.draw_row_indices(MercMap(), lons, lats)
+        x0, x1, y0, y1 = kwargs['extent']
+        expected_x, expected_y = MercMap()([-5.05, 0.05], [48.95, 59.05])
+        np.testing.assert_allclose((x0, x1), expected_x)
+        np.testing.assert_allclose((y0, y1), expected_y)
+
+    def test_cyl_rows_unchanged(self):
+        lons = np.linspace(-5, 0, 50)
+        lats = np.linspace(49, 59, 1000)
+        image, _ = self.draw_row_indices(CylMap(), lons, lats)
+        np.testing.assert_array_equal(image[:, 0], np.arange(lats.size))
+        self.assert_rows_placed(CylMap(), lons, lats)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class NetCDFVariable:
+    """Minimal stand-in for a variable of an xarray dataset opened with
+    `decode_cf=False`."""
+    def __init__(self, variable):
+        variable.set_auto_maskandscale(False)
+        self.values = variable[:]
+        self.attrs = {name: variable.getncattr(name)
+                      for name in variable.ncattrs()}
+
+
+class TestOpenIfgNetCDF(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write_netcdf(self, name, fill_value=None, **attrs):
+        """Write a 3x4 'delay' NetCDF file with some fill values and values
+        outside its valid range."""
+        path = os.path.join(self.directory, name)
+        with netCDF4.Dataset(path, 'w') as df:
+            df.createDimension('lat', 3)
+            df.createDimension('lon', 4)
+            df.createVariable('lat', 'f4', ('lat',))[:] = [50, 51, 52]
+            df.createVariable('lon', 'f4', ('lon',))[:] = [0, 1, 2, 3]
+            delay = df.createVariable('delay', 'f4', ('lat', 'lon'),
+                                      fill_value=fill_value)
+            delay.setncatts(attrs)
+            delay.set_auto_maskandscale(False)
+            values = np.arange(12, dtype='f4').reshape(3, 4)
+            values[0, 1] = (netCDF4.default_fillvals['f4'] if fill_value is None
+                            else fill_value)
+            delay[:] = values
+
+        return path
+
+    def assert_same_as_netcdf4(self, path, mask=True):
+        with netCDF4.Dataset(path) as df:
+            expected = df.variables['delay'][:]
+            actual = plot._netcdf4_values(NetCDFVariable(df.variables['delay']),
+                                          mask=mask)
+
+        if mask:
+            np.testing.assert_array_equal(np.ma.getmaskarray(actual),
+                                          np.ma.getmaskarray(expected))
+            np.testing.assert_array_equal(actual.compressed(),
+                                          expected.compressed())
+        else:
+            np.testing.assert_array_equal(actual, expected.data)
+
+    def test_default_fill_value(self):
+        self.assert_same_as_netcdf4(self.write_netcdf('20170101_20170102.nc'))
+
+    def test_fill_value_and_valid_range(self):
+        path = self.write_netcdf('20170101_20170102.nc', fill_value=-9999,
+                                 valid_range=np.array([1, 10], 'f4'),
+                                 missing_value=np.float32(5))
+        self.assert_same_as_netcdf4(path)
+
+    def test_scaled(self):
+        path = self.write_netcdf('20170101_20170102.nc', fill_value=-9999,
+                                 scale_factor=np.float32(0.5),
+                                 add_offset=np.float32(1))
+        self.assert_same_as_netcdf4(path)
+        self.assert_same_as_netcdf4(path, mask=False)
+
+    def test_fallback_reads_like_from_netcdf(self):
+        path = self.write_netcdf('20170101_20170102.nc', fill_value=-9999)
+        with mock.patch.dict(sys.modules, {'xarray': None}):
+            ifg = plot._open_ifg_nc(path)
+
+        expected = insar.InSAR.from_netcdf(path)
+        np.testing.assert_array_equal(ifg.lons, expected.lons)
+        np.testing.assert_array_equal(ifg.lats, expected.lats)
+        np.testing.assert_array_equal(np.ma.getmaskarray(ifg.data),
+                                      np.ma.getmaskarray(expected.data))
+        self.assertTrue(np.ma.getmaskarray(ifg.data)[0, 1])
+        self.assertEqual((ifg.master_date, ifg.slave_date),
+                         (expected.master_date, expected.slave_date))